@@ -1,108 +1,2346 @@
 import discord
 from discord import app_commands
 import os
-from datetime import datetime
+from datetime import datetime, date
 from dotenv import load_dotenv
 import json
+import math
 import time
 import asyncio
+import bisect
+import csv
+import functools
+import gzip
+import hashlib
+import inspect
+import itertools
+import heapq
+import random
+import re
+import shutil
+import struct
+import tempfile
+from collections import namedtuple, Counter
+from contextlib import contextmanager
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 
 load_dotenv()
 
-class StaffDatabase:
+class Histogram:
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=None):
+        self.buckets = buckets or self.BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+class Metrics:
+    BYTE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608, 33554432)
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = Counter()
+        self.log_task = None
+        self.server = None
+
+    def histogram(self, name, labels, buckets=None):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = Histogram(buckets)
+            self.histograms[key] = histogram
+        return histogram
+
+    def observe(self, name, value, buckets=None, **labels):
+        self.histogram(name, labels, buckets).observe(value)
+
+    def inc(self, name, value=1, **labels):
+        self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+    def render(self):
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{name}{self.format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{self.format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{self.format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"{name}_sum{self.format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{self.format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        lines = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if histogram.count:
+                lines.append(f"{name}{self.format_labels(labels)} n={histogram.count} "
+                             f"avg={histogram.sum / histogram.count:.4f} p95<={histogram.quantile(0.95)}")
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{name}{self.format_labels(labels)} {value}")
+        return lines
+
+    async def handle_request(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[1] == "/metrics":
+                status, body = "200 OK", self.render().encode('utf-8')
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def log_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            lines = self.summary()
+            if lines:
+                print("📈 Метрики:\n" + "\n".join(f"   {line}" for line in lines))
+
+    async def start(self, port=None, log_interval=600):
+        if port:
+            self.server = await asyncio.start_server(self.handle_request, '127.0.0.1', port)
+            print(f"📈 Метрики доступны на http://127.0.0.1:{port}/metrics")
+        if log_interval:
+            self.log_task = asyncio.create_task(self.log_loop(log_interval))
+
+    async def stop(self):
+        if self.log_task is not None:
+            self.log_task.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+metrics = Metrics()
+
+async def observe_api(call, awaitable):
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        return await awaitable
+    except discord.HTTPException as e:
+        outcome = str(e.status)
+        raise
+    except Exception as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        metrics.observe("discord_api_seconds", time.perf_counter() - started, call=call, outcome=outcome)
+
+@functools.lru_cache(maxsize=4096)
+def date_ordinal(text: str):
+    try:
+        day, month, year = text.split(".")
+        return date(int(year), int(month), int(day)).toordinal()
+    except (ValueError, AttributeError):
+        return None
+
+@functools.lru_cache(maxsize=4096)
+def format_ordinal(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime("%d.%m.%Y")
+
+class EmployeeRecord:
+    __slots__ = ("name", "position", "joined", "active", "warnings", "extra")
+    FIELDS = ("name", "position", "join_date", "active")
+    positions = {}
+
+    def __init__(self, name, position, joined=0, active=True, warnings=0, extra=None):
+        self.name = name
+        self.position = self.positions.setdefault(position, position)
+        self.joined = joined
+        self.active = active
+        self.warnings = warnings
+        self.extra = extra
+
+    @classmethod
+    def from_json(cls, record: dict):
+        extra = {key: value for key, value in record.items() if key not in cls.FIELDS}
+        employee = cls(record.get("name", ""), record.get("position", ""), 0,
+                       bool(record.get("active", True)), 0, extra or None)
+        employee.set_join_date(record.get("join_date", ""))
+        return employee
+
+    @property
+    def join_date(self) -> str:
+        if self.joined:
+            return format_ordinal(self.joined)
+        return (self.extra or {}).get("join_date", "")
+
+    @property
+    def departed(self) -> str:
+        return (self.extra or {}).get("departed", "")
+
+    def copy(self):
+        return EmployeeRecord(self.name, self.position, self.joined, self.active, self.warnings, self.extra)
+
+    def drop_extra(self, key):
+        if self.extra and key in self.extra:
+            self.extra = {name: value for name, value in self.extra.items() if name != key} or None
+
+    def set_join_date(self, value):
+        ordinal = date_ordinal(value)
+        if ordinal is not None:
+            self.joined = ordinal
+            self.drop_extra("join_date")
+        else:
+            self.joined = 0
+            self.extra = dict(self.extra or {}, join_date=value)
+
+    def update(self, fields: dict):
+        for key, value in fields.items():
+            if key == "name":
+                self.name = value
+            elif key == "position":
+                self.position = self.positions.setdefault(value, value)
+            elif key == "join_date":
+                self.set_join_date(value)
+            elif key == "active":
+                self.active = bool(value)
+            elif value is None:
+                self.drop_extra(key)
+            else:
+                self.extra = dict(self.extra or {}, **{key: value})
+
+    def to_json(self) -> dict:
+        record = {"name": self.name, "position": self.position, "join_date": self.join_date, "active": self.active}
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+class StaffSnapshot:
+    CHUNK = 1024
+    __slots__ = ("version", "slots", "order", "chunks", "size", "orphan_warnings")
+
+    def __init__(self, version, slots, order, chunks, size, orphan_warnings):
+        self.version = version
+        self.slots = slots
+        self.order = order
+        self.chunks = chunks
+        self.size = size
+        self.orphan_warnings = orphan_warnings
+
+    @classmethod
+    def build(cls, employees: dict, orphan_warnings: dict):
+        order = list(employees)
+        records = list(employees.values())
+        chunks = tuple(records[start:start + cls.CHUNK] for start in range(0, len(records), cls.CHUNK))
+        return cls(0, {user_id: position for position, user_id in enumerate(order)}, order, chunks, len(order), orphan_warnings)
+
+    def position(self, user_id: int):
+        position = self.slots.get(user_id)
+        return position if position is not None and position < self.size else None
+
+    def get(self, user_id: int, default=None):
+        position = self.position(user_id)
+        if position is None:
+            return default
+        return self.chunks[position // self.CHUNK][position % self.CHUNK]
+
+    def __contains__(self, user_id):
+        return self.position(user_id) is not None
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return itertools.islice(self.order, self.size)
+
+    def values(self):
+        return itertools.chain.from_iterable(self.chunks)
+
+    def items(self):
+        return zip(iter(self), self.values())
+
+    def warnings(self, user_id: int) -> int:
+        record = self.get(user_id)
+        return record.warnings if record is not None else self.orphan_warnings.get(user_id, 0)
+
+    def replace(self, user_id: int, record, orphan_warnings=None):
+        if orphan_warnings is None:
+            orphan_warnings = self.orphan_warnings
+        if record is None:
+            return StaffSnapshot(self.version + 1, self.slots, self.order, self.chunks, self.size, orphan_warnings)
+
+        size = self.size
+        position = self.position(user_id)
+        if position is None:
+            position = size
+            size += 1
+            self.order.append(user_id)
+            self.slots[user_id] = position
+
+        chunks = list(self.chunks)
+        index, offset = divmod(position, self.CHUNK)
+        if index == len(chunks):
+            chunks.append([record])
+        else:
+            chunk = list(chunks[index])
+            if offset == len(chunk):
+                chunk.append(record)
+            else:
+                chunk[offset] = record
+            chunks[index] = chunk
+        return StaffSnapshot(self.version + 1, self.slots, self.order, tuple(chunks), size, orphan_warnings)
+
+    def to_json(self) -> dict:
+        warnings = {str(user_id): record.warnings for user_id, record in self.items() if record.warnings}
+        warnings.update((str(user_id), count) for user_id, count in self.orphan_warnings.items())
+        return {
+            "employees": {str(user_id): record.to_json() for user_id, record in self.items()},
+            "warnings": warnings
+        }
+
+    def write_json(self, f):
+        f.write('{\n  "employees": {')
+        separator = "\n    "
+        for user_id, record in self.items():
+            f.write(f'{separator}"{user_id}": {json.dumps(record.to_json(), ensure_ascii=False)}')
+            separator = ",\n    "
+        f.write('\n  },\n  "warnings": {')
+        separator = "\n    "
+        warnings = ((user_id, record.warnings) for user_id, record in self.items() if record.warnings)
+        for user_id, count in itertools.chain(warnings, self.orphan_warnings.items()):
+            f.write(f'{separator}"{user_id}": {count}')
+            separator = ",\n    "
+        f.write('\n  }\n}\n')
+
+class StaffData:
+    def __init__(self, employees=None, orphan_warnings=None):
+        self.snapshot = StaffSnapshot.build(employees or {}, orphan_warnings or {})
+
+    @classmethod
+    def build(cls, employees: dict, warnings: dict):
+        orphan_warnings = {}
+        for user_id, count in warnings.items():
+            record = employees.get(user_id)
+            if record is not None:
+                record.warnings = count
+            else:
+                orphan_warnings[user_id] = count
+        return cls(employees, orphan_warnings)
+
+    @classmethod
+    def from_json(cls, raw: dict):
+        employees = {int(user_id): EmployeeRecord.from_json(record) for user_id, record in raw.get("employees", {}).items()}
+        return cls.build(employees, {int(user_id): count for user_id, count in raw.get("warnings", {}).items()})
+
+    @property
+    def employees(self) -> StaffSnapshot:
+        return self.snapshot
+
+    @property
+    def orphan_warnings(self) -> dict:
+        return self.snapshot.orphan_warnings
+
+    def to_json(self) -> dict:
+        return self.snapshot.to_json()
+
+    def warnings(self, user_id: int) -> int:
+        return self.snapshot.warnings(user_id)
+
+    def apply(self, op):
+        kind, user_id = op[0], int(op[1])
+        snapshot = self.snapshot
+        record = snapshot.get(user_id)
+        orphan_warnings = snapshot.orphan_warnings
+        if kind == "add":
+            added = EmployeeRecord.from_json(op[2])
+            if record is not None:
+                added.warnings = record.warnings
+            elif user_id in orphan_warnings:
+                orphan_warnings = dict(orphan_warnings)
+                added.warnings = orphan_warnings.pop(user_id)
+            self.snapshot = snapshot.replace(user_id, added, orphan_warnings)
+        elif kind in ("update", "remove"):
+            if record is not None:
+                record = record.copy()
+                if kind == "update":
+                    record.update(op[2])
+                else:
+                    record.active = False
+                self.snapshot = snapshot.replace(user_id, record)
+        elif kind in ("set_warnings", "remove_warnings"):
+            count = op[2] if kind == "set_warnings" else 0
+            if record is not None:
+                record = record.copy()
+                record.warnings = count
+            elif kind == "set_warnings":
+                orphan_warnings = {**orphan_warnings, user_id: count}
+            if kind == "remove_warnings" and user_id in orphan_warnings:
+                orphan_warnings = {key: value for key, value in orphan_warnings.items() if key != user_id}
+            self.snapshot = snapshot.replace(user_id, record, orphan_warnings)
+
+class TrieNode:
+    __slots__ = ("edges", "values")
+
+    def __init__(self):
+        self.edges = None
+        self.values = None
+
+def common_prefix(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    index = 0
+    while index < limit and a[index] == b[index]:
+        index += 1
+    return index
+
+class PrefixTrie:
+    def __init__(self):
+        self.root = TrieNode()
+
+    def build(self, pairs):
+        self.root = TrieNode()
+        stack = [(self.root, 0)]
+        previous = None
+        for term, value in sorted(pairs):
+            if term == previous:
+                stack[-1][0].values.append(value)
+                continue
+            shared = common_prefix(previous, term) if previous is not None else 0
+            while stack[-1][1] > shared:
+                stack.pop()
+            node, depth = stack[-1]
+            if depth < shared:
+                edge = node.edges[term[depth]]
+                label, child = edge
+                middle = TrieNode()
+                middle.edges = {label[shared - depth]: [label[shared - depth:], child]}
+                edge[0], edge[1] = label[:shared - depth], middle
+                stack.append((middle, shared))
+                node, depth = middle, shared
+            if depth == len(term):
+                node.values = [value]
+            else:
+                leaf = TrieNode()
+                leaf.values = [value]
+                if node.edges is None:
+                    node.edges = {}
+                node.edges[term[depth]] = [term[depth:], leaf]
+                stack.append((leaf, len(term)))
+            previous = term
+
+    def add(self, term: str, value):
+        node = self.root
+        rest = term
+        while rest:
+            edge = node.edges.get(rest[0]) if node.edges else None
+            if edge is None:
+                leaf = TrieNode()
+                leaf.values = [value]
+                if node.edges is None:
+                    node.edges = {}
+                node.edges[rest[0]] = [rest, leaf]
+                return
+            label, child = edge
+            if rest.startswith(label):
+                common = len(label)
+            else:
+                common = len(os.path.commonprefix((label, rest)))
+                middle = TrieNode()
+                middle.edges = {label[common]: [label[common:], child]}
+                edge[0], edge[1] = label[:common], middle
+                child = middle
+            node = child
+            rest = rest[common:]
+        if node.values is None:
+            node.values = []
+        node.values.append(value)
+
+    def remove(self, term: str, value):
+        path = []
+        node = self.root
+        rest = term
+        while rest:
+            edge = node.edges.get(rest[0]) if node.edges else None
+            if edge is None or not rest.startswith(edge[0]):
+                return
+            path.append((node, edge))
+            node = edge[1]
+            rest = rest[len(edge[0]):]
+        if not node.values or value not in node.values:
+            return
+        node.values.remove(value)
+        if node.values:
+            return
+        node.values = None
+
+        if path and not node.edges:
+            parent, edge = path.pop()
+            del parent.edges[edge[0][0]]
+            node = parent
+        if path and node.values is None and node.edges and len(node.edges) == 1:
+            _, edge = path[-1]
+            label, child = next(iter(node.edges.values()))
+            edge[0], edge[1] = edge[0] + label, child
+
+    def find(self, prefix: str):
+        node = self.root
+        rest = prefix
+        while rest:
+            edge = node.edges.get(rest[0]) if node.edges else None
+            if edge is None:
+                return None
+            label, child = edge
+            if rest.startswith(label):
+                node = child
+                rest = rest[len(label):]
+            elif label.startswith(rest):
+                return child
+            else:
+                return None
+        return node
+
+    def values(self, prefix: str):
+        node = self.find(prefix)
+        stack = [node] if node is not None else []
+        while stack:
+            node = stack.pop()
+            if node.values:
+                yield from node.values
+            if node.edges:
+                stack.extend(child for _, child in node.edges.values())
+
+    def complete(self, prefix: str, limit: int):
+        node = self.find(prefix)
+        stack = [node] if node is not None else []
+        found = []
+        while stack and len(found) < limit:
+            node = stack.pop()
+            if node.values:
+                found.extend(node.values[:limit - len(found)])
+            if node.edges:
+                stack.extend(node.edges[key][1] for key in sorted(node.edges, reverse=True))
+        return found
+
+class StaffIndex:
+    def __init__(self):
+        self.entries = {}
+        self.by_position = {}
+        self.by_warnings = {}
+        self.by_joined = []
+        self.names = PrefixTrie()
+        self.positions = PrefixTrie()
+
+    @staticmethod
+    def name_terms(name: str):
+        lowered = name.lower()
+        return {lowered, *lowered.split()}
+
+    def build(self, employees: dict):
+        names = []
+        for user_id, record in employees.items():
+            if not record.active:
+                continue
+            entry = (record.name, record.position, record.warnings, record.joined)
+            self.entries[user_id] = entry
+            self.by_position.setdefault(record.position, set()).add(user_id)
+            self.by_warnings.setdefault(record.warnings, set()).add(user_id)
+            self.by_joined.append((record.joined, user_id))
+            names.extend((term, user_id) for term in self.name_terms(record.name))
+        self.by_joined.sort()
+        self.names.build(names)
+        self.positions.build((position.lower(), position) for position in self.by_position)
+
+    def refresh(self, user_id: int, record):
+        entry = (record.name, record.position, record.warnings, record.joined) if record is not None and record.active else None
+        previous = self.entries.get(user_id)
+        if previous == entry:
+            return
+        if previous is not None:
+            self.discard(user_id, previous)
+        if entry is not None:
+            self.add(user_id, entry)
+
+    def add(self, user_id, entry):
+        name, position, warnings, joined = entry
+        self.entries[user_id] = entry
+        if position not in self.by_position:
+            self.by_position[position] = set()
+            self.positions.add(position.lower(), position)
+        self.by_position[position].add(user_id)
+        self.by_warnings.setdefault(warnings, set()).add(user_id)
+        bisect.insort(self.by_joined, (joined, user_id))
+        for term in self.name_terms(name):
+            self.names.add(term, user_id)
+
+    def discard(self, user_id, entry):
+        name, position, warnings, joined = entry
+        del self.entries[user_id]
+        members = self.by_position[position]
+        members.discard(user_id)
+        if not members:
+            del self.by_position[position]
+            self.positions.remove(position.lower(), position)
+        members = self.by_warnings[warnings]
+        members.discard(user_id)
+        if not members:
+            del self.by_warnings[warnings]
+        index = bisect.bisect_left(self.by_joined, (joined, user_id))
+        if index < len(self.by_joined) and self.by_joined[index] == (joined, user_id):
+            del self.by_joined[index]
+        for term in self.name_terms(name):
+            self.names.remove(term, user_id)
+
+    def joined_between(self, since=None, until=None):
+        lo = bisect.bisect_left(self.by_joined, (since,)) if since is not None else 0
+        hi = bisect.bisect_left(self.by_joined, (until + 1,)) if until is not None else len(self.by_joined)
+        return {user_id for _, user_id in self.by_joined[lo:hi]}
+
+    def search(self, position=None, name=None, warnings=None, since=None, until=None):
+        candidates = []
+        if position:
+            matched = set()
+            for canonical in self.positions.values(position.lower()):
+                matched |= self.by_position[canonical]
+            candidates.append(matched)
+        if warnings is not None:
+            candidates.append(self.by_warnings.get(warnings, set()))
+        if name:
+            candidates.append(set(self.names.values(name.lower())))
+        if since is not None or until is not None:
+            candidates.append(self.joined_between(since, until))
+        if not candidates:
+            return set(self.entries)
+
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for other in candidates[1:]:
+            result &= other
+        return result
+
+class StorageBackend:
+    executor = None
+    location = ""
+
+    def load(self):
+        raise NotImplementedError
+
+    def append(self, ops):
+        raise NotImplementedError
+
+    def compaction_due(self):
+        return False
+
+    def rotate(self):
+        pass
+
+    def compact(self, snapshot):
+        pass
+
+    def close(self):
+        pass
+
+class JsonStorage(StorageBackend):
+    COMPACT_THRESHOLD = 500
+
     def __init__(self, filename='staff_data.json'):
         self.filename = filename
+        self.journal_filename = f"{filename}.journal"
+        self.rotated_filename = f"{filename}.journal.old"
+        self.location = os.path.abspath(filename)
+        self.journal_size = 0
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            data = StaffData()
+            self.compact(data.snapshot)
+        else:
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as f:
+                    data = StaffData.from_json(json.load(f))
+            except:
+                data = StaffData()
+
+        self.journal_size = self.replay_journal(data, self.rotated_filename) + self.replay_journal(data, self.journal_filename)
+        if self.journal_size:
+            print(f"📜 Применено записей журнала: {self.journal_size}")
+        return data
+
+    def replay_journal(self, data, filename):
+        if not os.path.exists(filename):
+            return 0
+
+        count = 0
+        offset = 0
+        with open(filename, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("неполная строка")
+                    op = json.loads(line)
+                except ValueError:
+                    print(f"⚠️ Повреждённый хвост журнала обрезан после {count} записей")
+                    break
+                data.apply(op)
+                offset += len(line)
+                count += 1
+        if offset < os.path.getsize(filename):
+            os.truncate(filename, offset)
+        return count
+
+    def append(self, ops):
+        lines = "".join(json.dumps(op, ensure_ascii=False, separators=(',', ':')) + "\n" for op in ops).encode('utf-8')
+        with open(self.journal_filename, 'ab', buffering=0) as f:
+            start = f.seek(0, os.SEEK_END)
+            try:
+                view = memoryview(lines)
+                while view:
+                    view = view[f.write(view):]
+                os.fsync(f.fileno())
+            except OSError:
+                f.truncate(start)
+                raise
+        self.journal_size += len(ops)
+        return len(lines)
+
+    def compaction_due(self):
+        return self.journal_size >= self.COMPACT_THRESHOLD
+
+    def rotate(self):
+        if not os.path.exists(self.journal_filename):
+            return
+        if os.path.exists(self.rotated_filename):
+            with open(self.journal_filename, 'rb') as src, open(self.rotated_filename, 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.journal_filename)
+        else:
+            os.replace(self.journal_filename, self.rotated_filename)
+        self.journal_size = 0
+
+    def compact(self, snapshot):
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            snapshot.write_json(f)
+            f.flush()
+            os.fsync(f.fileno())
+            written = f.tell()
+        os.replace(tmp_filename, self.filename)
+        if os.path.exists(self.rotated_filename):
+            os.remove(self.rotated_filename)
+        return written
+
+class SqliteStorage(StorageBackend):
+    EMPLOYEE_COLUMNS = ("name", "position", "join_date", "active")
+
+    def __init__(self, filename='staff_data.sqlite3', migrate_from='staff_data.json'):
+        self.filename = filename
+        self.migrate_from = migrate_from
+        self.location = os.path.abspath(filename)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="staff-sqlite")
+        self.conn = None
+
+    def connect(self):
+        self.conn = sqlite3.connect(self.filename, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS employees (
+                user_id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                position TEXT NOT NULL,
+                join_date TEXT NOT NULL,
+                active INTEGER NOT NULL DEFAULT 1,
+                extra TEXT
+            );
+            CREATE TABLE IF NOT EXISTS warnings (
+                user_id INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            DROP INDEX IF EXISTS idx_employees_active;
+            DROP INDEX IF EXISTS idx_employees_position;
+            DROP INDEX IF EXISTS idx_warnings_count;
+        """)
+
+    def load(self):
+        self.connect()
+        migrated = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+        if migrated is None and self.migrate_from and os.path.exists(self.migrate_from):
+            self.migrate(JsonStorage(self.migrate_from).load())
+
+        employees = {}
+        for user_id, name, position, join_date, active, extra in self.conn.execute(
+                "SELECT user_id, name, position, join_date, active, extra FROM employees"):
+            record = EmployeeRecord(name, position, 0, bool(active), 0, json.loads(extra) if extra else None)
+            record.set_join_date(join_date)
+            employees[user_id] = record
+        return StaffData.build(employees, dict(self.conn.execute("SELECT user_id, count FROM warnings")))
+
+    def migrate(self, data):
+        with self.conn:
+            raw = data.to_json()
+            for user_id, record in raw["employees"].items():
+                self.write_op(["add", user_id, record])
+            for user_id, count in raw["warnings"].items():
+                self.write_op(["set_warnings", user_id, count])
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                              (os.path.abspath(self.migrate_from),))
+        print(f"📦 Перенесено из {self.migrate_from}: {len(data.employees)} сотрудников")
+
+    def split_record(self, record):
+        columns = {key: record[key] for key in self.EMPLOYEE_COLUMNS if key in record}
+        extra = {key: value for key, value in record.items() if key not in self.EMPLOYEE_COLUMNS}
+        return columns, extra
+
+    def write_op(self, op):
+        kind, user_id = op[0], int(op[1])
+        if kind == "add":
+            columns, extra = self.split_record(op[2])
+            self.conn.execute(
+                "INSERT OR REPLACE INTO employees (user_id, name, position, join_date, active, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, columns.get("name", ""), columns.get("position", ""), columns.get("join_date", ""),
+                 int(columns.get("active", True)), json.dumps(extra, ensure_ascii=False) if extra else None))
+        elif kind == "update":
+            columns, extra = self.split_record(op[2])
+            if "active" in columns:
+                columns["active"] = int(columns["active"])
+            if columns:
+                assignments = ", ".join(f"{key} = ?" for key in columns)
+                self.conn.execute(f"UPDATE employees SET {assignments} WHERE user_id = ?", (*columns.values(), user_id))
+            if extra:
+                row = self.conn.execute("SELECT extra FROM employees WHERE user_id = ?", (user_id,)).fetchone()
+                if row is not None:
+                    merged = json.loads(row[0]) if row[0] else {}
+                    merged.update(extra)
+                    merged = {key: value for key, value in merged.items() if value is not None}
+                    self.conn.execute("UPDATE employees SET extra = ? WHERE user_id = ?",
+                                      (json.dumps(merged, ensure_ascii=False) if merged else None, user_id))
+        elif kind == "remove":
+            self.conn.execute("UPDATE employees SET active = 0 WHERE user_id = ?", (user_id,))
+        elif kind == "set_warnings":
+            self.conn.execute("INSERT OR REPLACE INTO warnings (user_id, count) VALUES (?, ?)", (user_id, op[2]))
+        elif kind == "remove_warnings":
+            self.conn.execute("DELETE FROM warnings WHERE user_id = ?", (user_id,))
+
+    def append(self, ops):
+        with self.conn:
+            for op in ops:
+                self.write_op(op)
+
+    def compact(self, snapshot):
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def create_storage(backend=None, directory=None):
+    backend = backend or os.getenv('STORAGE_BACKEND', 'json')
+    if directory is None:
+        if backend == 'sqlite':
+            return SqliteStorage()
+        return JsonStorage()
+
+    os.makedirs(directory, exist_ok=True)
+    if backend == 'sqlite':
+        return SqliteStorage(os.path.join(directory, 'staff_data.sqlite3'), migrate_from=None)
+    return JsonStorage(os.path.join(directory, 'staff_data.json'))
+
+LEDGER_KINDS = ("warn", "unwarn", "payment", "vacation", "dismiss")
+
+LedgerEvent = namedtuple("LedgerEvent", ["kind", "timestamp", "user_id", "actor_id", "amount", "text"])
+
+LEDGER_LABELS = {
+    "warn": "⚠️ Выговор",
+    "unwarn": "✅ Снятие выговора",
+    "payment": "💰 Выплата",
+    "vacation": "🏖️ Отпуск",
+    "dismiss": "🚪 Увольнение",
+}
+
+MAX_AMOUNT = 1_000_000_000
+
+def parse_amount(text: str):
+    cleaned = text.lower().replace(" ", "").replace("_", "").replace(",", ".")
+    for suffix in ("робуксов", "робукса", "робукс"):
+        if cleaned.endswith(suffix):
+            cleaned = cleaned[:-len(suffix)]
+            break
+    multiplier = 1
+    if cleaned.endswith(("k", "к")):
+        multiplier = 1000
+        cleaned = cleaned[:-1]
+    if not re.fullmatch(r"\d{1,12}(\.\d+)?", cleaned):
+        return None
+    value = round(float(cleaned) * multiplier)
+    return value if 0 < value <= MAX_AMOUNT else None
+
+DURATION_UNITS = (
+    (("мес", "mo"), 30 * 86400),
+    (("мин", "m"), 60),
+    (("ч", "h"), 3600),
+    (("д", "d"), 86400),
+    (("н", "w"), 7 * 86400),
+)
+
+MAX_DURATION = 5 * 365 * 86400
+
+def parse_duration(text: str):
+    cleaned = text.lower().replace(",", ".").strip()
+    if re.fullmatch(r"\d+(\.\d+)?", cleaned):
+        total = float(cleaned) * 86400
+        return total if 0 < total <= MAX_DURATION else None
+    total = 0
+    position = 0
+    for match in re.finditer(r"(\d+(?:\.\d+)?)\s*([a-zа-яё]+)", cleaned):
+        if cleaned[position:match.start()].strip():
+            return None
+        unit = next((seconds for prefixes, seconds in DURATION_UNITS if match.group(2).startswith(prefixes)), None)
+        if unit is None:
+            return None
+        total += float(match.group(1)) * unit
+        position = match.end()
+    if position == 0 or cleaned[position:].strip():
+        return None
+    return total if 0 < total <= MAX_DURATION else None
+
+class EventLedger:
+    MAGIC = b"SLG1"
+    RECORD = struct.Struct("<BqQQqH")
+    COMMIT_WINDOW = 0.05
+
+    def __init__(self, filename='staff_ledger.bin'):
+        self.filename = filename
+        self.size = 0
+        self.durable = 0
+        self.offsets = {}
+        self.totals = {}
+        self.buckets = {}
+        self.pending = []
+        self.unwritten = []
+        self.flush_task = None
+        self.load()
+        self.durable = self.size
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            with open(self.filename, 'wb') as f:
+                f.write(self.MAGIC)
+            self.size = len(self.MAGIC)
+            return
+
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        if not data.startswith(self.MAGIC):
+            raise ValueError(f"{self.filename} не является журналом событий")
+
+        offset = len(self.MAGIC)
+        count = 0
+        while offset < len(data):
+            end = offset + self.RECORD.size
+            if end > len(data):
+                break
+            kind, timestamp, user_id, actor_id, amount, length = self.RECORD.unpack_from(data, offset)
+            if end + length > len(data) or kind >= len(LEDGER_KINDS):
+                break
+            text = data[end:end + length].decode('utf-8', errors='ignore')
+            self.index(offset, LedgerEvent(LEDGER_KINDS[kind], timestamp, user_id, actor_id, amount, text))
+            offset = end + length
+            count += 1
+
+        if offset < len(data):
+            print(f"⚠️ Повреждённый хвост журнала событий обрезан после {count} записей")
+            os.truncate(self.filename, offset)
+        self.size = offset
+        if count:
+            print(f"📒 Событий в журнале: {count}")
+
+    def encode(self, event):
+        text = event.text.encode('utf-8')[:0xFFFF]
+        return self.RECORD.pack(LEDGER_KINDS.index(event.kind), event.timestamp, event.user_id,
+                                event.actor_id, event.amount, len(text)) + text
+
+    def index(self, offset, event):
+        self.offsets.setdefault(event.user_id, []).append(offset)
+        day = datetime.fromtimestamp(event.timestamp).toordinal()
+        for key in (event.user_id, None):
+            totals = self.totals.setdefault(key, {})
+            total = totals.setdefault(event.kind, [0, 0])
+            total[0] += 1
+            total[1] += event.amount
+
+            days, per_day = self.buckets.setdefault(key, ([], {}))
+            bucket = per_day.get(day)
+            if bucket is None:
+                bucket = {}
+                per_day[day] = bucket
+                if days and days[-1] > day:
+                    bisect.insort(days, day)
+                else:
+                    days.append(day)
+            total = bucket.setdefault(event.kind, [0, 0])
+            total[0] += 1
+            total[1] += event.amount
+
+    def record(self, kind, user_id, actor_id, amount=0, text="", timestamp=None):
+        event = LedgerEvent(kind, int(timestamp or time.time()), int(user_id), int(actor_id), int(amount), text)
+        payload = self.encode(event)
+        self.index(self.size, event)
+        self.size += len(payload)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((payload, future))
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = loop.create_task(self.flush_pending())
+        return future
+
+    def append(self, payload):
+        with open(self.filename, 'ab', buffering=0) as f:
+            start = f.seek(0, os.SEEK_END)
+            try:
+                view = memoryview(payload)
+                while view:
+                    view = view[f.write(view):]
+                os.fsync(f.fileno())
+            except OSError:
+                f.truncate(start)
+                raise
+        return len(payload)
+
+    async def flush_pending(self):
+        loop = asyncio.get_running_loop()
+        while self.pending or self.unwritten:
+            await asyncio.sleep(self.COMMIT_WINDOW)
+            batch, self.pending = self.pending, []
+            payloads, self.unwritten = self.unwritten + [payload for payload, _ in batch], []
+            try:
+                with metrics.timer("staff_db_write_seconds", kind="ledger"):
+                    written = await loop.run_in_executor(None, self.append, b"".join(payloads))
+                self.durable += written
+                metrics.observe("staff_db_write_bytes", written, buckets=Metrics.BYTE_BUCKETS, kind="ledger")
+                error = None
+            except Exception as e:
+                print(f"❌ Ошибка записи журнала событий, отложено записей: {len(payloads)}: {e}")
+                self.unwritten = payloads
+                error = e
+
+            for _, future in batch:
+                if not future.done():
+                    if error is None:
+                        future.set_result(True)
+                    else:
+                        future.set_exception(error)
+            if error is not None and not self.pending:
+                break
+
+    async def flush(self):
+        if self.unwritten and (self.flush_task is None or self.flush_task.done()):
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush_pending())
+        if self.flush_task is not None:
+            await self.flush_task
+
+    def aggregate(self, user_id=None, since=None, until=None):
+        if since is None and until is None:
+            return {kind: list(total) for kind, total in self.totals.get(user_id, {}).items()}
+
+        days, per_day = self.buckets.get(user_id, ([], {}))
+        lo = bisect.bisect_left(days, since) if since is not None else 0
+        hi = bisect.bisect_right(days, until) if until is not None else len(days)
+        result = {}
+        for day in days[lo:hi]:
+            for kind, (count, amount) in per_day[day].items():
+                total = result.setdefault(kind, [0, 0])
+                total[0] += count
+                total[1] += amount
+        return result
+
+    def read_events(self, offsets):
+        events = []
+        with open(self.filename, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                kind, timestamp, user_id, actor_id, amount, length = self.RECORD.unpack(f.read(self.RECORD.size))
+                text = f.read(length).decode('utf-8', errors='ignore')
+                events.append(LedgerEvent(LEDGER_KINDS[kind], timestamp, user_id, actor_id, amount, text))
+        return events
+
+    def iter_events(self, end):
+        with open(self.filename, 'rb') as f:
+            offset = len(self.MAGIC)
+            f.seek(offset)
+            while offset < end:
+                kind, timestamp, user_id, actor_id, amount, length = self.RECORD.unpack(f.read(self.RECORD.size))
+                text = f.read(length).decode('utf-8', errors='ignore')
+                yield LedgerEvent(LEDGER_KINDS[kind], timestamp, user_id, actor_id, amount, text)
+                offset += self.RECORD.size + length
+
+    async def history(self, user_id, limit=10):
+        await self.flush()
+        offsets = self.offsets.get(int(user_id), [])
+        end = bisect.bisect_left(offsets, self.durable)
+        offsets = offsets[max(0, end - limit):end][::-1]
+        return await asyncio.get_running_loop().run_in_executor(None, self.read_events, offsets)
+
+class StaffDatabase:
+    COMMIT_WINDOW = 0.05
+
+    def __init__(self, storage=None, ledger=None):
+        self.storage = storage or JsonStorage()
+        self.ledger = ledger or EventLedger()
         self.lock = asyncio.Lock()
+        self.compacting = asyncio.Lock()
+        self.pending = []
+        self.unwritten = []
+        self.flush_task = None
+        self.compaction_task = None
+        self.listeners = []
         self.data = self.load_data()
-        print(f"📁 База загружена: {os.path.abspath(self.filename)}")
-        print(f"📊 Сотрудников в базе: {len(self.data['employees'])}")
+        self.index = StaffIndex()
+        self.index.build(self.data.employees)
+        print(f"📁 База загружена: {self.storage.location}")
+        print(f"📊 Сотрудников в базе: {len(self.data.employees)}")
+
+    def load_data(self):
+        return self.storage.load()
+
+    async def save_data(self):
+        loop = asyncio.get_running_loop()
+        async with self.compacting:
+            async with self.lock:
+                locked_at = time.perf_counter()
+                try:
+                    await loop.run_in_executor(self.storage.executor, self.storage.rotate)
+                    snapshot = self.snapshot()
+                except Exception as e:
+                    print(f"❌ Ошибка ротации журнала: {e}")
+                    return
+                finally:
+                    metrics.observe("staff_db_lock_held_seconds", time.perf_counter() - locked_at)
+
+            try:
+                with metrics.timer("staff_db_write_seconds", kind="snapshot"):
+                    written = await loop.run_in_executor(self.storage.executor, self.storage.compact, snapshot)
+                if written:
+                    metrics.observe("staff_db_write_bytes", written, buckets=Metrics.BYTE_BUCKETS, kind="snapshot")
+            except Exception as e:
+                print(f"❌ Ошибка сохранения: {e}")
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def snapshot(self) -> StaffSnapshot:
+        return self.data.snapshot
+
+    def commit(self, op):
+        self.data.apply(op)
+        user_id = int(op[1])
+        self.index.refresh(user_id, self.data.employees.get(user_id))
+        for listener in self.listeners:
+            listener(op)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((op, future))
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = loop.create_task(self.flush_pending())
+        return future
+
+    def committed(self):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(True)
+        return future
+
+    async def write_ops(self, ops):
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            locked_at = time.perf_counter()
+            try:
+                with metrics.timer("staff_db_write_seconds", kind="journal"):
+                    written = await loop.run_in_executor(self.storage.executor, self.storage.append, ops)
+                if written:
+                    metrics.observe("staff_db_write_bytes", written, buckets=Metrics.BYTE_BUCKETS, kind="journal")
+                metrics.observe("staff_db_batch_size", len(ops), buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+            finally:
+                metrics.observe("staff_db_lock_held_seconds", time.perf_counter() - locked_at)
+
+    async def flush_pending(self):
+        while self.pending:
+            await asyncio.sleep(self.COMMIT_WINDOW)
+            batch, self.pending = self.pending, []
+            ops, self.unwritten = self.unwritten + [op for op, _ in batch], []
+            error = None
+            try:
+                await self.write_ops(ops)
+            except Exception as e:
+                print(f"❌ Ошибка записи журнала, отложено записей: {len(ops)}: {e}")
+                self.unwritten = ops
+                error = e
+
+            for _, future in batch:
+                if not future.done():
+                    if error is None:
+                        future.set_result(True)
+                    else:
+                        future.set_exception(error)
+
+            if self.storage.compaction_due() and (self.compaction_task is None or self.compaction_task.done()):
+                self.compaction_task = asyncio.get_running_loop().create_task(self.save_data())
+
+    async def flush(self):
+        if self.flush_task is not None:
+            await self.flush_task
+
+    async def close(self):
+        await self.flush()
+        if self.compaction_task is not None:
+            await self.compaction_task
+        if self.unwritten:
+            ops, self.unwritten = self.unwritten, []
+            try:
+                await self.write_ops(ops)
+            except Exception as e:
+                print(f"❌ Записи журнала потеряны при закрытии: {len(ops)}: {e}")
+        await self.ledger.flush()
+        await asyncio.get_running_loop().run_in_executor(self.storage.executor, self.storage.close)
+        if self.storage.executor is not None:
+            self.storage.executor.shutdown(wait=False)
+
+    def add_employee(self, user_id, name, position, join_date):
+        return self.commit(["add", str(user_id), {
+            "name": name,
+            "position": position,
+            "join_date": join_date,
+            "active": True
+        }])
+
+    def update_employee(self, user_id: int, **kwargs):
+        if user_id in self.data.employees:
+            return self.commit(["update", str(user_id), kwargs])
+        return self.committed()
+
+    def remove_employee(self, user_id: int):
+        if user_id in self.data.employees:
+            return self.commit(["remove", str(user_id)])
+        return self.committed()
+
+    def get_employee(self, user_id: int) -> EmployeeRecord:
+        return self.data.snapshot.get(user_id)
+
+    def get_all_employees(self):
+        return {user_id: record for user_id, record in self.data.snapshot.items() if record.active}
+
+    def set_warnings(self, user_id: int, count: int):
+        return self.commit(["set_warnings", str(user_id), count])
+
+    def get_warnings(self, user_id: int) -> int:
+        return self.data.warnings(user_id)
+
+    def remove_warnings(self, user_id: int):
+        if self.data.warnings(user_id) or user_id in self.data.orphan_warnings:
+            return self.commit(["remove_warnings", str(user_id)])
+        return self.committed()
+
+class GuildDatabases:
+    def __init__(self, config, data_dir='data', backend=None):
+        self.config = config
+        self.data_dir = data_dir
+        self.backend = backend or os.getenv('STORAGE_BACKEND', 'json')
+        self.partitions = {}
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+        for guild_id, database in self.partitions.items():
+            database.add_listener(functools.partial(listener, guild_id))
+
+    def storage_for(self, guild_id: int):
+        legacy_guild_id = self.config.data.get("legacy_guild_id")
+        if legacy_guild_id is not None and int(legacy_guild_id) == guild_id:
+            return create_storage(self.backend)
+        return create_storage(self.backend, os.path.join(self.data_dir, str(guild_id)))
+
+    def ledger_for(self, guild_id: int):
+        legacy_guild_id = self.config.data.get("legacy_guild_id")
+        if legacy_guild_id is not None and int(legacy_guild_id) == guild_id:
+            return EventLedger()
+        return EventLedger(os.path.join(self.data_dir, str(guild_id), 'staff_ledger.bin'))
+
+    def get(self, guild_id: int) -> StaffDatabase:
+        database = self.partitions.get(guild_id)
+        if database is None:
+            database = StaffDatabase(self.storage_for(guild_id), self.ledger_for(guild_id))
+            for listener in self.listeners:
+                database.add_listener(functools.partial(listener, guild_id))
+            self.partitions[guild_id] = database
+        return database
+
+    def load_all(self):
+        if os.path.isdir(self.data_dir):
+            for name in os.listdir(self.data_dir):
+                if name.isdigit():
+                    self.get(int(name))
+        legacy_guild_id = self.config.data.get("legacy_guild_id")
+        if legacy_guild_id is not None:
+            self.get(int(legacy_guild_id))
+        elif os.path.exists('staff_data.json') or os.path.exists('staff_data.sqlite3'):
+            raise RuntimeError("Найдена общая база staff_data без legacy_guild_id в bot_config.json. "
+                               "Укажите ID сервера, которому она принадлежит, иначе роли сотрудников будут сняты")
+
+    async def unload(self, guild_id: int):
+        database = self.partitions.pop(guild_id, None)
+        if database is not None:
+            await database.close()
+
+    async def close(self):
+        await asyncio.gather(*(database.close() for database in self.partitions.values()))
+        self.partitions.clear()
+
+CommandLimit = namedtuple("CommandLimit", ["rate", "per", "burst"])
+
+COMMAND_LIMITS = {
+    "add_employee": CommandLimit(rate=1, per=5, burst=1),
+    "warn": CommandLimit(rate=1, per=10, burst=1),
+    "remove_warn": CommandLimit(rate=1, per=5, burst=1),
+    "salary": CommandLimit(rate=1, per=5, burst=1),
+    "dismiss": CommandLimit(rate=1, per=10, burst=1),
+    "vacation": CommandLimit(rate=1, per=5, burst=1),
+    "reminder": CommandLimit(rate=1, per=5, burst=1),
+    "export": CommandLimit(rate=1, per=60, burst=1),
+}
+
+class CooldownEngine:
+    def __init__(self, limits):
+        self.limits = limits
+        self.command_ids = {command: index for index, command in enumerate(limits)}
+        self.buckets = {}
+        self.expiry = []
+        self.hits = Counter()
+        self.allowed = Counter()
+
+    def evict(self, now):
+        while self.expiry and self.expiry[0][0] <= now:
+            full_at, key = heapq.heappop(self.expiry)
+            bucket = self.buckets.get(key)
+            if bucket is not None and bucket[2] == full_at:
+                del self.buckets[key]
+
+    def hit(self, user_id: int, command: str) -> float:
+        limit = self.limits[command]
+        key = (user_id, self.command_ids[command])
+        now = time.monotonic()
+        self.evict(now)
+
+        refill = limit.rate / limit.per
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            tokens = float(limit.burst)
+        else:
+            tokens = min(float(limit.burst), bucket[0] + (now - bucket[1]) * refill)
+
+        if tokens < 1:
+            self.hits[command] += 1
+            metrics.inc("cooldown_limited_total", command=command)
+            return (1 - tokens) / refill
+
+        tokens -= 1
+        full_at = now + (limit.burst - tokens) / refill
+        self.buckets[key] = [tokens, now, full_at]
+        heapq.heappush(self.expiry, (full_at, key))
+        self.allowed[command] += 1
+        return 0.0
+
+    def stats(self):
+        return {
+            command: {"allowed": self.allowed[command], "limited": self.hits[command]}
+            for command in self.limits
+        }
+
+STAFF_ROLE_ID = 1200579581111959620
+WARNING_ROLE_ID = 1398751720665780324
+
+DEFAULT_CONFIG = {
+    "staff_role": STAFF_ROLE_ID,
+    "warning_role": WARNING_ROLE_ID,
+    "legacy_guild_id": None,
+    "allowed_roles": [
+        1200579581149712416, 1200579581149712417, 1200579581149712415,
+        1200579581128749114, 1200579581128749113, 1402693590655963156,
+        1200579581128749112
+    ],
+    "warning_decay_days": 30,
+    "guilds": {}
+}
+
+class BotConfig:
+    def __init__(self, filename='bot_config.json'):
+        self.filename = filename
+        self.data = self.load()
+
+    def load(self):
+        data = json.loads(json.dumps(DEFAULT_CONFIG))
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as f:
+                    data.update(json.load(f))
+            except Exception as e:
+                print(f"❌ Ошибка загрузки конфигурации: {e}")
+        return data
+
+    def guild(self, guild_id: int) -> dict:
+        settings = {key: value for key, value in self.data.items() if key != "guilds"}
+        settings.update(self.data["guilds"].get(str(guild_id), {}))
+        return settings
+
+class PermissionResolver:
+    def __init__(self, config: BotConfig):
+        self.config = config
+        self.allowed = {}
+        self.cache = {}
+
+    def allowed_roles(self, guild_id: int) -> frozenset:
+        roles = self.allowed.get(guild_id)
+        if roles is None:
+            roles = frozenset(int(role_id) for role_id in self.config.guild(guild_id)["allowed_roles"])
+            self.allowed[guild_id] = roles
+        return roles
+
+    def is_allowed(self, member: discord.Member) -> bool:
+        key = (member.guild.id, member.id)
+        allowed = self.cache.get(key)
+        if allowed is None:
+            roles = self.allowed_roles(member.guild.id)
+            allowed = member.guild_permissions.administrator or any(role.id in roles for role in member.roles)
+            self.cache[key] = allowed
+        return allowed
+
+    def invalidate_member(self, guild_id: int, member_id: int):
+        self.cache.pop((guild_id, member_id), None)
+
+    def invalidate_guild(self, guild_id: int):
+        self.cache = {key: value for key, value in self.cache.items() if key[0] != guild_id}
+
+    def reload(self):
+        self.config.data = self.config.load()
+        self.allowed.clear()
+        self.cache.clear()
+
+class RoleReconciler:
+    DEBOUNCE = 0.5
+    SWEEP_INTERVAL = 3600
+    SWEEP_CHUNK = 500
+
+    def __init__(self, client: discord.Client, databases: GuildDatabases, config: BotConfig):
+        self.client = client
+        self.databases = databases
+        self.config = config
+        self.pending = set()
+        self.wakeup = asyncio.Event()
+        self.tasks = []
+        databases.add_listener(self.on_change)
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.run()), asyncio.create_task(self.sweep_loop())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def on_change(self, guild_id, op):
+        self.schedule(guild_id, int(op[1]))
+
+    def schedule(self, guild_id: int, user_id: int):
+        self.pending.add((guild_id, user_id))
+        self.wakeup.set()
+
+    def managed_roles(self, guild_id: int) -> frozenset:
+        settings = self.config.guild(guild_id)
+        return frozenset({int(settings["staff_role"]), int(settings["warning_role"])})
+
+    def desired_roles(self, guild: discord.Guild, user_id: int, settings=None) -> set:
+        settings = settings or self.config.guild(guild.id)
+        database = self.databases.get(guild.id)
+        roles = set()
+        employee = database.get_employee(user_id)
+        if employee is not None and employee.active:
+            roles.add(int(settings["staff_role"]))
+        if database.get_warnings(user_id) > 0:
+            roles.add(int(settings["warning_role"]))
+        return {role_id for role_id in roles if guild.get_role(role_id)}
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            await asyncio.sleep(self.DEBOUNCE)
+            self.wakeup.clear()
+            batch, self.pending = self.pending, set()
+            for guild_id, user_id in batch:
+                guild = self.client.get_guild(guild_id)
+                member = guild.get_member(user_id) if guild else None
+                if member is None:
+                    continue
+                try:
+                    await self.apply(member)
+                except Exception as e:
+                    print(f"❌ Ошибка синхронизации ролей {guild_id}/{user_id}: {e}")
+
+    async def apply(self, member: discord.Member):
+        guild = member.guild
+        current = {role.id for role in member.roles if role.id != guild.id}
+        target = (current - self.managed_roles(guild.id)) | self.desired_roles(guild, member.id)
+        if target == current:
+            return
+
+        roles = [role for role in (guild.get_role(role_id) for role_id in target) if role is not None]
+        try:
+            await observe_api("role_edit", member.edit(roles=roles, reason="Синхронизация ролей сотрудников"))
+        except Exception as e:
+            print(f"❌ Ошибка синхронизации ролей {member}: {e}")
+
+    async def sweep_loop(self):
+        await self.client.wait_until_ready()
+        while True:
+            await self.sweep()
+            await asyncio.sleep(self.SWEEP_INTERVAL)
+
+    async def sweep(self):
+        for guild in list(self.client.guilds):
+            if guild.id not in self.databases.partitions:
+                continue
+            try:
+                await self.sweep_guild(guild)
+            except Exception as e:
+                print(f"❌ Ошибка проверки ролей сервера {guild.id}: {e}")
+
+    async def sweep_guild(self, guild: discord.Guild):
+        settings = self.config.guild(guild.id)
+        managed = self.managed_roles(guild.id)
+        for index, member in enumerate(guild.members, 1):
+            current = {role.id for role in member.roles} & managed
+            if current != self.desired_roles(guild, member.id, settings):
+                self.schedule(guild.id, member.id)
+            if index % self.SWEEP_CHUNK == 0:
+                await asyncio.sleep(0)
+                if guild.id not in self.databases.partitions:
+                    return
+
+class MembershipReconciler:
+    DEBOUNCE = 1.0
+    CHUNK = 500
+
+    def __init__(self, client: discord.Client, databases: GuildDatabases):
+        self.client = client
+        self.databases = databases
+        self.pending = set()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.resync_tasks = set()
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        tasks = list(self.resync_tasks) + ([self.task] if self.task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = None
+        self.resync_tasks.clear()
+
+    def employee(self, guild_id: int, user_id: int) -> EmployeeRecord:
+        database = self.databases.partitions.get(guild_id)
+        record = database.get_employee(user_id) if database is not None else None
+        return record if record is not None and record.active else None
+
+    def diff(self, record: EmployeeRecord, member: discord.Member) -> dict:
+        if member is None:
+            return {} if record.departed else {"departed": datetime.now().strftime("%d.%m.%Y")}
+        fields = {}
+        if record.departed:
+            fields["departed"] = None
+        if member.display_name != record.name:
+            fields["name"] = member.display_name
+        return fields
+
+    def schedule(self, guild_id: int, user_id: int):
+        if self.employee(guild_id, user_id) is not None:
+            self.pending.add((guild_id, user_id))
+            self.wakeup.set()
+
+    def resync(self, shard_id=None):
+        task = asyncio.create_task(self.reconcile_all(shard_id))
+        self.resync_tasks.add(task)
+        task.add_done_callback(self.resync_tasks.discard)
+
+    async def reconcile_all(self, shard_id=None):
+        for guild in list(self.client.guilds):
+            if guild.id in self.databases.partitions and (shard_id is None or guild.shard_id == shard_id):
+                await self.reconcile_guild(guild)
+
+    async def reconcile_guild(self, guild: discord.Guild):
+        if not guild.chunked:
+            try:
+                await guild.chunk()
+            except Exception as e:
+                print(f"❌ Не удалось загрузить участников сервера {guild.id}: {e}")
+                return
+
+        started = time.perf_counter()
+        employees = list(self.databases.get(guild.id).get_all_employees().items())
+        found = 0
+        for start in range(0, len(employees), self.CHUNK):
+            for user_id, record in employees[start:start + self.CHUNK]:
+                if self.diff(record, guild.get_member(user_id)):
+                    self.pending.add((guild.id, user_id))
+                    found += 1
+            await asyncio.sleep(0)
+        if found:
+            self.wakeup.set()
+        metrics.observe("member_sync_seconds", time.perf_counter() - started)
+        print(f"👥 Сверка участников {guild.name}: {len(employees)} работников, изменений: {found}")
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            await asyncio.sleep(self.DEBOUNCE)
+            self.wakeup.clear()
+            batch, self.pending = self.pending, set()
+            await self.apply(batch)
+
+    async def apply(self, batch):
+        commits = []
+        for index, (guild_id, user_id) in enumerate(batch, 1):
+            guild = self.client.get_guild(guild_id)
+            record = self.employee(guild_id, user_id)
+            if guild is None or guild.unavailable or not guild.chunked or record is None:
+                continue
+            fields = self.diff(record, guild.get_member(user_id))
+            if fields:
+                commits.append(self.databases.get(guild_id).update_employee(user_id, **fields))
+                metrics.inc("member_sync_updates", kind="departed" if fields.get("departed") else "refresh")
+            if index % self.CHUNK == 0:
+                await asyncio.sleep(0)
+        for result in await asyncio.gather(*commits, return_exceptions=True):
+            if isinstance(result, Exception):
+                print(f"❌ Ошибка сохранения данных участника: {result}")
+
+class NotificationQueue:
+    WORKERS = 2
+    MAX_ATTEMPTS = 5
+    BASE_DELAY = 1.0
+    MAX_DELAY = 60.0
+
+    def __init__(self, client: discord.Client, filename='pending_dm.json', persist=True):
+        self.client = client
+        self.filename = filename
+        self.persist = persist
+        self.queue = asyncio.Queue()
+        self.pending = {}
+        self.route_reset = {}
+        self.workers = []
+        self.save_task = None
+        self.dirty = False
+        self.next_id = 0
+
+    def start(self):
+        if self.persist and os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except Exception as e:
+                print(f"❌ Ошибка загрузки очереди ЛС: {e}")
+                entries = []
+            for entry in entries:
+                self.next_id = max(self.next_id, entry["id"] + 1)
+                self.pending[entry["id"]] = entry
+                self.queue.put_nowait(entry)
+            if entries:
+                print(f"📨 Восстановлено сообщений в очереди ЛС: {len(entries)}")
+
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.WORKERS)]
+
+    async def stop(self):
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        if self.save_task is not None:
+            await self.save_task
+
+    def enqueue(self, user_id: int, embed: discord.Embed):
+        entry = {"id": self.next_id, "user_id": user_id, "embed": embed.to_dict(), "attempts": 0}
+        self.next_id += 1
+        self.pending[entry["id"]] = entry
+        self.queue.put_nowait(entry)
+        self.save_pending()
+
+    def save_pending(self):
+        if not self.persist:
+            return
+        self.dirty = True
+        if self.save_task is None or self.save_task.done():
+            self.save_task = asyncio.create_task(self.write_pending())
+
+    async def write_pending(self):
+        loop = asyncio.get_running_loop()
+        while self.dirty:
+            self.dirty = False
+            payload = json.dumps(list(self.pending.values()), ensure_ascii=False)
+            try:
+                await loop.run_in_executor(None, self.write_file, payload)
+            except Exception as e:
+                print(f"❌ Ошибка сохранения очереди ЛС: {e}")
 
-    def load_data(self):
-        base_data = {"employees": {}, "warnings": {}}
-        if not os.path.exists(self.filename):
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump(base_data, f, ensure_ascii=False, indent=2)
-            return base_data
+    def write_file(self, payload):
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_filename, self.filename)
+
+    def finish(self, entry):
+        self.pending.pop(entry["id"], None)
+        self.save_pending()
+
+    def retry(self, entry, delay):
+        entry["attempts"] += 1
+        if entry["attempts"] >= self.MAX_ATTEMPTS:
+            print(f"❌ Не удалось доставить сообщение {entry['user_id']} после {entry['attempts']} попыток")
+            self.finish(entry)
+            return
+        asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, entry)
+
+    def backoff(self, attempts):
+        return min(self.MAX_DELAY, self.BASE_DELAY * 2 ** attempts) * random.uniform(0.5, 1.5)
+
+    async def worker(self):
+        while True:
+            entry = await self.queue.get()
+            try:
+                await self.deliver(entry)
+            except Exception as e:
+                print(f"❌ Ошибка очереди ЛС: {e}")
+                self.finish(entry)
+            finally:
+                self.queue.task_done()
+
+    async def deliver(self, entry):
+        user_id = entry["user_id"]
+        wait = self.route_reset.get(user_id, 0) - time.monotonic()
+        if wait > 0:
+            asyncio.get_running_loop().call_later(wait, self.queue.put_nowait, entry)
+            return
 
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return base_data
+            user = self.client.get_user(user_id) or await self.client.fetch_user(user_id)
+            await observe_api("dm", user.send(embed=discord.Embed.from_dict(entry["embed"])))
+        except discord.Forbidden:
+            print(f"Не удалось отправить сообщение {user_id} - закрытые ЛС")
+        except discord.NotFound:
+            print(f"Не удалось отправить сообщение {user_id} - пользователь не найден")
+        except discord.RateLimited as e:
+            self.route_reset[user_id] = time.monotonic() + e.retry_after
+            self.retry(entry, e.retry_after)
+            return
+        except (discord.HTTPException, OSError, asyncio.TimeoutError) as e:
+            retry_after = getattr(e, 'retry_after', None)
+            if getattr(e, 'status', None) == 429 and retry_after:
+                self.route_reset[user_id] = time.monotonic() + retry_after
+                self.retry(entry, retry_after)
+            else:
+                self.retry(entry, self.backoff(entry["attempts"]))
+            return
+        else:
+            self.route_reset.pop(user_id, None)
 
-    async def save_data(self):
-        async with self.lock:
+        self.finish(entry)
+
+class Scheduler:
+    def __init__(self, filename='scheduled_events.json', persist=True):
+        self.filename = filename
+        self.persist = persist
+        self.handlers = {}
+        self.entries = {}
+        self.targets = {}
+        self.heap = []
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.save_task = None
+        self.dirty = False
+        self.next_id = 0
+
+    def register(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    def start(self):
+        if self.persist and os.path.exists(self.filename):
             try:
-                with open(self.filename, 'w', encoding='utf-8') as f:
-                    json.dump(self.data, f, ensure_ascii=False, indent=2)
+                with open(self.filename, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
             except Exception as e:
-                print(f"❌ Ошибка сохранения: {e}")
+                print(f"❌ Ошибка загрузки расписания: {e}")
+                entries = []
+            for entry in entries:
+                self.next_id = max(self.next_id, entry["id"] + 1)
+                self.add(entry)
+            self.heap = [(entry["due"], entry["id"]) for entry in self.entries.values()]
+            heapq.heapify(self.heap)
+            overdue = sum(1 for due, _ in self.heap if due <= time.time())
+            if entries:
+                print(f"⏰ Запланированных событий: {len(entries)}, пропущенных: {overdue}")
 
-    async def add_employee(self, user_id, name, position, join_date):
-        self.data["employees"][str(user_id)] = {
-            "name": name,
-            "position": position,
-            "join_date": join_date,
-            "active": True
-        }
-        await self.save_data()
+        self.task = asyncio.create_task(self.run())
 
-    async def update_employee(self, user_id, **kwargs):
-        if str(user_id) in self.data["employees"]:
-            for key, value in kwargs.items():
-                self.data["employees"][str(user_id)][key] = value
-            await self.save_data()
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.save_task is not None:
+            await self.save_task
 
-    async def remove_employee(self, user_id):
-        if str(user_id) in self.data["employees"]:
-            self.data["employees"][str(user_id)]["active"] = False
-            await self.save_data()
+    def add(self, entry):
+        self.entries[entry["id"]] = entry
+        self.targets.setdefault((entry["guild_id"], entry["user_id"]), set()).add(entry["id"])
 
-    def get_employee(self, user_id):
-        return self.data["employees"].get(str(user_id))
+    def discard(self, entry_id):
+        entry = self.entries.pop(entry_id, None)
+        if entry is not None:
+            key = (entry["guild_id"], entry["user_id"])
+            ids = self.targets.get(key)
+            ids.discard(entry_id)
+            if not ids:
+                del self.targets[key]
+        return entry
 
-    def get_all_employees(self):
-        return {uid: data for uid, data in self.data["employees"].items() if data.get("active", True)}
+    def schedule(self, kind: str, due: float, guild_id: int, user_id: int, actor_id: int = 0, data=None):
+        entry = {"id": self.next_id, "due": due, "kind": kind, "guild_id": guild_id,
+                 "user_id": user_id, "actor_id": actor_id, "data": data or {}}
+        self.next_id += 1
+        self.add(entry)
+        heapq.heappush(self.heap, (due, entry["id"]))
+        if self.heap[0][1] == entry["id"]:
+            self.wakeup.set()
+        self.save_pending()
+        return entry
+
+    def pending(self, guild_id: int, user_id: int, kinds=None):
+        entries = (self.entries[entry_id] for entry_id in self.targets.get((guild_id, user_id), ()))
+        return sorted((entry for entry in entries if kinds is None or entry["kind"] in kinds),
+                      key=lambda entry: entry["due"])
+
+    def cancel(self, guild_id: int, user_id: int, kinds=None, limit=None):
+        entries = self.pending(guild_id, user_id, kinds)
+        if limit is not None:
+            entries = entries[:limit]
+        for entry in entries:
+            self.discard(entry["id"])
+        if entries:
+            self.save_pending()
+        return len(entries)
+
+    def save_pending(self):
+        if not self.persist:
+            return
+        self.dirty = True
+        if self.save_task is None or self.save_task.done():
+            self.save_task = asyncio.create_task(self.write_pending())
+
+    async def write_pending(self):
+        loop = asyncio.get_running_loop()
+        while self.dirty:
+            self.dirty = False
+            payload = json.dumps(list(self.entries.values()), ensure_ascii=False)
+            try:
+                await loop.run_in_executor(None, self.write_file, payload)
+            except Exception as e:
+                print(f"❌ Ошибка сохранения расписания: {e}")
+
+    def write_file(self, payload):
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_filename, self.filename)
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            while self.heap and self.heap[0][1] not in self.entries:
+                heapq.heappop(self.heap)
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                timer = asyncio.get_running_loop().call_later(delay, self.wakeup.set)
+                try:
+                    await self.wakeup.wait()
+                finally:
+                    timer.cancel()
+                continue
+
+            _, entry_id = heapq.heappop(self.heap)
+            entry = self.discard(entry_id)
+            self.save_pending()
+            handler = self.handlers.get(entry["kind"])
+            if handler is None:
+                print(f"⚠️ Неизвестный тип события: {entry['kind']}")
+                continue
+            metrics.observe("scheduler_lag_seconds", time.time() - entry["due"], kind=entry["kind"])
+            try:
+                await handler(entry)
+            except Exception as e:
+                print(f"❌ Ошибка обработки события {entry['kind']}: {e}")
+
+class RosterExport:
+    ROSTER_COLUMNS = ("user_id", "name", "position", "join_date", "active")
+    HISTORY_COLUMNS = ("timestamp", "kind", "user_id", "actor_id", "amount", "text")
+
+    def __init__(self, database: StaffDatabase, fmt: str, include_warnings=False, include_history=False):
+        self.fmt = fmt
+        self.employees = database.snapshot()
+        self.include_warnings = include_warnings
+        self.ledger = database.ledger if include_history else None
+        self.ledger_end = 0
+
+    async def run(self, directory: str, limit: int):
+        if self.ledger is not None:
+            await self.ledger.flush()
+            self.ledger_end = self.ledger.durable
+        return await asyncio.get_running_loop().run_in_executor(None, self.write_files, directory, limit)
+
+    def write_files(self, directory, limit):
+        columns = self.ROSTER_COLUMNS + (("warnings",) if self.include_warnings else ())
+        paths = [self.write_rows(os.path.join(directory, f"staff.{self.fmt}"), columns, self.roster_rows())]
+        if self.ledger is not None:
+            paths.append(self.write_rows(os.path.join(directory, f"history.{self.fmt}"),
+                                         self.HISTORY_COLUMNS, self.history_rows()))
+        return [self.fit(path, limit) for path in paths]
+
+    def roster_rows(self):
+        for user_id, record in self.employees.items():
+            row = [str(user_id), record.name, record.position, record.join_date, record.active]
+            if self.include_warnings:
+                row.append(record.warnings)
+            yield row
+
+    def history_rows(self):
+        for event in self.ledger.iter_events(self.ledger_end):
+            yield [datetime.fromtimestamp(event.timestamp).isoformat(), event.kind, str(event.user_id),
+                   str(event.actor_id), event.amount, event.text]
+
+    def write_rows(self, path, columns, rows):
+        if self.fmt == "csv":
+            with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                writer.writerows(rows)
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n")
+        return path
+
+    def fit(self, path, limit):
+        if os.path.getsize(path) <= limit:
+            return path
+        with open(path, 'rb') as src, gzip.open(f"{path}.gz", 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+        return f"{path}.gz"
+
+class StaffListPages:
+    PAGE_SIZE = 10
+
+    def __init__(self, databases: GuildDatabases):
+        self.databases = databases
+        self.orders = {}
+        self.pages = {}
+        self.page_keys = {}
+        databases.add_listener(self.invalidate)
+
+    def invalidate(self, guild_id, op):
+        kind, user_id = op[0], int(op[1])
+        if kind in ("add", "remove") or (kind == "update" and "active" in op[2]):
+            self.orders.pop(guild_id, None)
+            self.pages.pop(guild_id, None)
+            self.page_keys = {key: pages for key, pages in self.page_keys.items() if key[0] != guild_id}
+            return
+
+        guild_pages = self.pages.get(guild_id, {})
+        for page in self.page_keys.pop((guild_id, user_id), ()):
+            guild_pages.pop(page, None)
+
+    def active_ids(self, guild_id: int):
+        order = self.orders.get(guild_id)
+        if order is None:
+            order = list(self.databases.get(guild_id).get_all_employees())
+            self.orders[guild_id] = order
+        return order
+
+    def page_count(self, guild_id: int):
+        return max(1, -(-len(self.active_ids(guild_id)) // self.PAGE_SIZE))
+
+    def get_page(self, guild: discord.Guild, page: int) -> discord.Embed:
+        guild_pages = self.pages.setdefault(guild.id, {})
+        embed = guild_pages.get(page)
+        if embed is None:
+            embed = self.render(guild, page)
+            guild_pages[page] = embed
+        return embed
+
+    def render(self, guild: discord.Guild, page: int) -> discord.Embed:
+        snapshot = self.databases.get(guild.id).snapshot()
+        order = self.active_ids(guild.id)
+        user_ids = order[page * self.PAGE_SIZE:(page + 1) * self.PAGE_SIZE]
+
+        embed = discord.Embed(title="📂 База работников", color=0x00ff00)
+        for user_id in user_ids:
+            record = snapshot.get(user_id)
+            member = guild.get_member(user_id)
+            if member is not None:
+                mention = member.mention
+            elif record.departed:
+                mention = f"{record.name} (покинул сервер {record.departed})"
+            else:
+                mention = record.name
+
+            warn_text = f" ({record.warnings} выговоров)" if record.warnings > 0 else ""
+
+            embed.add_field(
+                name=f"{record.position} - {record.name}",
+                value=f"{mention}{warn_text}\nПринят: {record.join_date}",
+                inline=False
+            )
+            self.page_keys.setdefault((guild.id, user_id), set()).add(page)
+
+        embed.set_footer(text=f"Страница {page + 1}/{self.page_count(guild.id)} • Всего работников: {len(order)}")
+        return embed
+
+class StaffListView(discord.ui.View):
+    def __init__(self, pages: StaffListPages, guild_id: int, author_id: int, page: int = 0):
+        super().__init__(timeout=180)
+        self.pages = pages
+        self.guild_id = guild_id
+        self.author_id = author_id
+        self.page = page
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.prev_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.pages.page_count(self.guild_id) - 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    async def show(self, interaction: discord.Interaction, page: int):
+        self.page = max(0, min(page, self.pages.page_count(self.guild_id) - 1))
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.pages.get_page(interaction.guild, self.page), view=self)
 
-    async def set_warnings(self, user_id, count):
-        self.data["warnings"][str(user_id)] = count
-        await self.save_data()
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
 
-    def get_warnings(self, user_id):
-        return self.data["warnings"].get(str(user_id), 0)
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
 
-    async def remove_warnings(self, user_id):
-        if str(user_id) in self.data["warnings"]:
-            del self.data["warnings"][str(user_id)]
-            await self.save_data()
+class CommandPipeline:
+    def __init__(self, bot):
+        self.bot = bot
+
+    def __call__(self, cooldown=None, permission=True, admin=False, defer=True, employee=False):
+        stages = [("guild", self.require_guild)]
+        if cooldown is not None:
+            stages.append(("cooldown", functools.partial(self.check_cooldown, command=cooldown)))
+        if admin:
+            stages.append(("permissions", self.require_admin))
+        elif permission:
+            stages.append(("permissions", self.require_permission))
+        if defer:
+            stages.append(("defer", self.defer))
+        if employee:
+            stages.append(("employee", self.require_employee))
+
+        def decorator(handler):
+            names = list(inspect.signature(handler).parameters)[1:]
+
+            @functools.wraps(handler)
+            async def run(interaction: discord.Interaction, *args, **kwargs):
+                command = interaction.command.name if interaction.command is not None else handler.__name__
+                params = dict(zip(names, args), **kwargs)
+                for name, stage in stages:
+                    started = time.perf_counter()
+                    proceed = await stage(interaction, params)
+                    metrics.observe("command_stage_seconds", time.perf_counter() - started, command=command, stage=name)
+                    if not proceed:
+                        return
+                with metrics.timer("command_stage_seconds", command=command, stage="handler"):
+                    await handler(interaction, *args, **kwargs)
+            return run
+        return decorator
+
+    async def reply(self, interaction: discord.Interaction, content: str):
+        if interaction.response.is_done():
+            await self.bot.followup(interaction, content, ephemeral=True)
+        else:
+            await interaction.response.send_message(content, ephemeral=True)
+
+    async def require_guild(self, interaction: discord.Interaction, params: dict) -> bool:
+        if interaction.guild is None:
+            await interaction.response.send_message("❌ Команды можно использовать только на сервере", ephemeral=True)
+            return False
+        interaction.extras["database"] = self.bot.databases.get(interaction.guild.id)
+        return True
+
+    async def defer(self, interaction: discord.Interaction, params: dict) -> bool:
+        try:
+            await self.bot.defer(interaction)
+        except Exception:
+            return False
+        return True
+
+    async def check_cooldown(self, interaction: discord.Interaction, params: dict, command: str) -> bool:
+        wait = self.bot.cooldowns.hit(interaction.user.id, command)
+        if wait > 0:
+            await self.reply(interaction, f"❌ Подождите {math.ceil(wait)} секунд перед следующей командой")
+            return False
+        return True
+
+    async def require_permission(self, interaction: discord.Interaction, params: dict) -> bool:
+        if not self.bot.permissions.is_allowed(interaction.user):
+            await self.reply(interaction, "❌ Недостаточно прав")
+            return False
+        return True
+
+    async def require_admin(self, interaction: discord.Interaction, params: dict) -> bool:
+        if not interaction.user.guild_permissions.administrator:
+            await self.reply(interaction, "❌ Недостаточно прав")
+            return False
+        return True
+
+    async def require_employee(self, interaction: discord.Interaction, params: dict) -> bool:
+        record = interaction.extras["database"].get_employee(params["employee"].id)
+        if record is None or not record.active:
+            await self.reply(interaction, "❌ Этот работник не найден в базе данных")
+            return False
+        interaction.extras["employee"] = record
+        return True
+
+class StaffCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started"] = time.perf_counter()
+        return True
+
+class StaffBot(discord.AutoShardedClient):
+    COMMAND_HASH_FILE = 'command_tree_hash.json'
 
-class StaffBot(discord.Client):
     def __init__(self):
         intents = discord.Intents.default()
         intents.members = True
         intents.message_content = True
-        super().__init__(intents=intents)
-        self.tree = app_commands.CommandTree(self)
-        self.database = StaffDatabase()
-        self.last_command_use = {}
+        shard_count = os.getenv('SHARD_COUNT')
+        super().__init__(intents=intents, shard_count=int(shard_count) if shard_count else None)
+        self.tree = StaffCommandTree(self)
+        self.config = BotConfig()
+        self.permissions = PermissionResolver(self.config)
+        self.databases = GuildDatabases(self.config)
+        self.staff_pages = StaffListPages(self.databases)
+        self.cooldowns = CooldownEngine(COMMAND_LIMITS)
+        self.pipeline = CommandPipeline(self)
+        self.notifications = NotificationQueue(self)
+        self.roles = RoleReconciler(self, self.databases, self.config)
+        self.membership = MembershipReconciler(self, self.databases)
+        self.membership_synced = False
+        self.scheduler = Scheduler()
+        self.scheduler.register("warning_decay", self.on_warning_decay)
+        self.scheduler.register("vacation_end", self.on_vacation_end)
+        self.scheduler.register("reminder", self.on_reminder)
+
+    async def close(self):
+        await metrics.stop()
+        await self.scheduler.stop()
+        await self.notifications.stop()
+        await self.roles.stop()
+        await self.membership.stop()
+        await self.databases.close()
+        await super().close()
 
     async def on_ready(self):
         print(f'✅ {self.user} ready to work!')
+        if not self.membership_synced:
+            self.membership_synced = True
+            self.membership.resync()
+
+    async def on_shard_ready(self, shard_id: int):
+        if self.membership_synced:
+            self.membership.resync(shard_id)
+
+    def record_command(self, interaction: discord.Interaction, outcome: str):
+        started = interaction.extras.get("started")
+        if started is not None and interaction.command is not None:
+            metrics.observe("command_seconds", time.perf_counter() - started,
+                            command=interaction.command.name, outcome=outcome)
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        self.record_command(interaction, "ok")
+
+    async def defer(self, interaction: discord.Interaction):
+        await observe_api("defer", interaction.response.defer(ephemeral=True))
+        started = interaction.extras.get("started")
+        if started is not None:
+            metrics.observe("command_defer_seconds", time.perf_counter() - started, command=interaction.command.name)
+
+    async def followup(self, interaction: discord.Interaction, *args, **kwargs):
+        return await observe_api("followup", interaction.followup.send(*args, **kwargs))
+
+    def command_tree_hash(self, guild=None) -> str:
+        commands = sorted((command.to_dict(self.tree) for command in self.tree.get_commands(guild=guild)),
+                          key=lambda command: command["name"])
+        payload = json.dumps(commands, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def sync_commands(self):
+        dev_guild_id = os.getenv('DEV_GUILD_ID')
+        guild = discord.Object(id=int(dev_guild_id)) if dev_guild_id else None
+        if guild is not None:
+            self.tree.copy_global_to(guild=guild)
+
+        scope = str(guild.id) if guild is not None else "global"
+        digest = self.command_tree_hash(guild)
+        hashes = {}
+        if os.path.exists(self.COMMAND_HASH_FILE):
+            try:
+                with open(self.COMMAND_HASH_FILE, 'r', encoding='utf-8') as f:
+                    hashes = json.load(f)
+            except Exception:
+                hashes = {}
+
+        if hashes.get(scope) == digest:
+            print(f'Commands unchanged ({scope}), sync skipped')
+            return
+
         try:
-            synced = await self.tree.sync()
-            print(f'Commands synced: {len(synced)}')
+            synced = await self.tree.sync(guild=guild)
+            print(f'Commands synced ({scope}): {len(synced)}')
         except Exception as e:
             print(f'❌ Error syncing commands: {e}')
+            return
 
-    async def send_to_employee_dm(self, employee: discord.Member, embed: discord.Embed):
-        try:
-            await employee.send(embed=embed)
-        except discord.Forbidden:
-            print(f"Не удалось отправить сообщение {employee.name} - закрытые ЛС")
+        hashes[scope] = digest
+        with open(self.COMMAND_HASH_FILE, 'w', encoding='utf-8') as f:
+            json.dump(hashes, f, indent=2)
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.roles != after.roles:
+            self.permissions.invalidate_member(after.guild.id, after.id)
+        if before.display_name != after.display_name:
+            self.membership.schedule(after.guild.id, after.id)
+
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        if before.display_name != after.display_name:
+            for guild in after.mutual_guilds:
+                self.membership.schedule(guild.id, after.id)
+
+    async def on_member_join(self, member: discord.Member):
+        self.membership.schedule(member.guild.id, member.id)
+
+    async def on_member_remove(self, member: discord.Member):
+        self.permissions.invalidate_member(member.guild.id, member.id)
+        self.membership.schedule(member.guild.id, member.id)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.permissions.invalidate_guild(guild.id)
+        await self.databases.unload(guild.id)
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if before.permissions != after.permissions:
+            self.permissions.invalidate_guild(after.guild.id)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.permissions.invalidate_guild(role.guild.id)
+
+    def send_to_employee_dm(self, employee: discord.Member, embed: discord.Embed):
+        self.notifications.enqueue(employee.id, embed)
+
+    def schedule_warning_decay(self, guild_id: int, user_id: int, actor_id: int):
+        days = self.config.guild(guild_id).get("warning_decay_days") or 0
+        if days:
+            self.scheduler.schedule("warning_decay", time.time() + float(days) * 86400, guild_id, user_id, actor_id)
+
+    async def on_warning_decay(self, entry):
+        database = self.databases.get(entry["guild_id"])
+        user_id = entry["user_id"]
+        warnings = database.get_warnings(user_id)
+        if warnings <= 0:
+            return
+
+        saved = database.remove_warnings(user_id) if warnings == 1 else database.set_warnings(user_id, warnings - 1)
+        await asyncio.gather(
+            saved,
+            database.ledger.record("unwarn", user_id, self.user.id if self.user else 0, 1, "Истёк срок действия выговора")
+        )
+
+        embed = discord.Embed(title="⏳ Срок действия выговора истёк", color=0x00ff00)
+        embed.add_field(name="Текущее количество", value=f"{warnings - 1}/3", inline=True)
+        self.notifications.enqueue(user_id, embed)
+
+    async def on_vacation_end(self, entry):
+        embed = discord.Embed(title="🏖️ Отпуск завершён", color=0x00ffff)
+        embed.add_field(name="Работник", value=f"<@{entry['user_id']}>", inline=True)
+        embed.add_field(name="Причина", value=entry["data"].get("reason", "Не указана"), inline=False)
+        self.notifications.enqueue(entry["user_id"], embed)
+        if entry["actor_id"]:
+            self.notifications.enqueue(entry["actor_id"], embed)
 
-    async def auto_dismiss_employee(self, interaction: discord.Interaction, employee: discord.Member):
-        employee_data = self.database.get_employee(employee.id)
-        start_date = employee_data.get("join_date", employee.joined_at.strftime("%d.%m.%Y")) if employee_data else employee.joined_at.strftime("%d.%m.%Y")
+    async def on_reminder(self, entry):
+        embed = discord.Embed(title="⏰ Напоминание", description=entry["data"]["text"], color=0xffcc00)
+        employee_id = entry["data"].get("employee_id")
+        if employee_id:
+            embed.add_field(name="Работник", value=f"<@{employee_id}>", inline=True)
+        self.notifications.enqueue(entry["user_id"], embed)
+
+    async def auto_dismiss_employee(self, interaction: discord.Interaction, employee: discord.Member, record: EmployeeRecord):
+        database = self.databases.get(employee.guild.id)
+        start_date = record.join_date
         
         embed = discord.Embed(
             title="🚪 Автоматическое увольнение работника", 
@@ -114,35 +2352,28 @@ class StaffBot(discord.Client):
         embed.add_field(name="Количество выговоров", value="3/3", inline=True)
         embed.set_footer(text="Автоматическое увольнение")
         
-        await interaction.followup.send(embed=embed)
-        await self.send_to_employee_dm(employee, embed)
-        
-        await self.database.remove_employee(employee.id)
-        await self.database.remove_warnings(employee.id)
-        
-        role_ids = [1200579581111959620]
-        for role_id in role_ids:
-            role = employee.guild.get_role(role_id)
-            if role:
-                try:
-                    await employee.remove_roles(role)
-                except:
-                    pass
-
-    def check_cooldown(self, user_id: int, command: str, cooldown: int = 5) -> bool:
-        key = f"{user_id}_{command}"
-        current_time = time.time()
-        
-        if key in self.last_command_use:
-            if current_time - self.last_command_use[key] < cooldown:
-                return False
+        await self.followup(interaction, embed=embed)
+        self.send_to_employee_dm(employee, embed)
         
-        self.last_command_use[key] = current_time
-        return True
+        await asyncio.gather(
+            database.remove_employee(employee.id),
+            database.remove_warnings(employee.id),
+            database.ledger.record("dismiss", employee.id, interaction.user.id, text="Достигнуто максимальное количество выговоров")
+        )
+        self.scheduler.cancel(employee.guild.id, employee.id, ("warning_decay", "vacation_end"))
 
     async def setup_hook(self):
+        metrics_port = os.getenv('METRICS_PORT')
+        await metrics.start(int(metrics_port) if metrics_port else None, int(os.getenv('METRICS_LOG_INTERVAL', '600')))
+        self.databases.load_all()
+        self.notifications.start()
+        self.roles.start()
+        self.membership.start()
+        self.scheduler.start()
+
         @self.tree.error
         async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+            self.record_command(interaction, "error")
             if isinstance(error, app_commands.CommandInvokeError):
                 original = error.original
                 if isinstance(original, discord.NotFound) and "Unknown interaction" in str(original):
@@ -153,7 +2384,7 @@ class StaffBot(discord.Client):
                 
                 try:
                     if interaction.response.is_done():
-                        await interaction.followup.send(
+                        await self.followup(interaction, 
                             "❌ Произошла критическая ошибка при выполнении команды", 
                             ephemeral=True
                         )
@@ -167,69 +2398,21 @@ class StaffBot(discord.Client):
             else:
                 print(f"❌ Ошибка команды: {error}")
 
-        async def is_guild(interaction: discord.Interaction) -> bool:
-            if interaction.guild is None:
-                await interaction.response.send_message(
-                    "❌ Команды можно использовать только на сервере",
-                    ephemeral=True
-                )
-                return False
-            return True
-
-        async def check_permissions(interaction: discord.Interaction) -> bool:
-            allowed_roles = [1200579581149712416, 1200579581149712417, 1200579581149712415, 
-                           1200579581128749114, 1200579581128749113, 1402693590655963156, 
-                           1200579581128749112]
-            user_roles = [role.id for role in interaction.user.roles]
-            
-            has_allowed = any(r in allowed_roles for r in user_roles)
-            is_admin_user = interaction.user.guild_permissions.administrator
-            
-            if not (has_allowed or is_admin_user):
-                return False
-            return True
-
-        async def check_employee_exists(interaction: discord.Interaction, employee: discord.Member) -> bool:
-            employee_data = self.database.get_employee(employee.id)
-            if not employee_data or not employee_data.get("active", True):
-                return False
-            return True
+        command = self.pipeline
 
         @self.tree.command(name="добавить_работника", description="Добавляет работника в базу данных")
         @app_commands.describe(employee="Выберите работника", position="Должность работника")
+        @command(cooldown="add_employee")
         async def add_employee(interaction: discord.Interaction, employee: discord.Member, position: str):
-            if not await is_guild(interaction):
-                return
-            
-            if not self.check_cooldown(interaction.user.id, "add_employee", 5):
-                await interaction.response.send_message("❌ Подождите 5 секунд перед следующей командой", ephemeral=True)
-                return
-            
-            if not await check_permissions(interaction):
-                await interaction.response.send_message("❌ Недостаточно прав", ephemeral=True)
-                return
-            
-            try:
-                await interaction.response.defer(ephemeral=True)
-            except:
-                return
-                  
-            existing_employee = self.database.get_employee(employee.id)
-            if existing_employee and existing_employee.get("active", True):
-                await interaction.followup.send("❌ Этот работник уже есть в базе данных", ephemeral=True)
+            database = interaction.extras["database"]
+
+            existing_employee = database.get_employee(employee.id)
+            if existing_employee is not None and existing_employee.active:
+                await self.followup(interaction, "❌ Этот работник уже есть в базе данных", ephemeral=True)
                 return
             
             join_date = datetime.now().strftime("%d.%m.%Y")
-            await self.database.add_employee(employee.id, employee.display_name, position, join_date)
-
-            role_ids = [1200579581111959620]
-            for role_id in role_ids:
-                role = employee.guild.get_role(role_id)
-                if role:
-                    try:
-                        await employee.add_roles(role)
-                    except Exception as e:
-                        print(f"❌ Ошибка выдачи роли: {e}")
+            await database.add_employee(employee.id, employee.display_name, position, join_date)
             
             embed = discord.Embed(title="✅ Работник добавлен в базу", color=0x00ff00)
             embed.add_field(name="Работник", value=employee.mention, inline=True)
@@ -237,108 +2420,57 @@ class StaffBot(discord.Client):
             embed.add_field(name="Дата приема", value=join_date, inline=True)
             embed.set_footer(text=f"Добавил: {interaction.user.display_name}")
             
-            await interaction.followup.send(embed=embed)
+            await self.followup(interaction, embed=embed)
 
         @self.tree.command(name="база_работников", description="Показывает список всех работников")
+        @command(permission=False)
         async def staff_list(interaction: discord.Interaction):
-            if not await is_guild(interaction):
-                await interaction.response.send_message("❌ Команды можно использовать только на сервере", ephemeral=True)
-                return
-
-            try:
-                await interaction.response.defer(ephemeral=True)
-            except Exception as e:
-                await interaction.response.send_message(f"❌ Ошибка при загрузке базы данных: {str(e)}", ephemeral=True)
-                return
-
-            employees = self.database.get_all_employees()
-            if not employees:
-                await interaction.followup.send("📂 База работников пуста", ephemeral=True)
+            if not self.staff_pages.active_ids(interaction.guild.id):
+                await self.followup(interaction, "📂 База работников пуста", ephemeral=True)
                 return
 
-            embed = discord.Embed(title="📂 База работников", color=0x00ff00)
-
-            for user_id, data in employees.items():
-                member = interaction.guild.get_member(int(user_id))
-                mention = member.mention if member else data["name"]
-
-                warnings = self.database.get_warnings(int(user_id))
-                warn_text = f" ({warnings} выговоров)" if warnings > 0 else ""
-
-                embed.add_field(
-                    name=f"{data['position']} - {data['name']}",
-                    value=f"{mention}{warn_text}\nПринят: {data['join_date']}",
-                    inline=False
-                )
-
-            await interaction.followup.send(embed=embed, ephemeral=True)
+            view = StaffListView(self.staff_pages, interaction.guild.id, interaction.user.id)
+            await self.followup(interaction, embed=self.staff_pages.get_page(interaction.guild, 0), view=view, ephemeral=True)
 
         @self.tree.command(name="инфо_работник", description="Информация о работнике")
         @app_commands.describe(employee="Выберите работника")
+        @command(permission=False, employee=True)
         async def employee_info(interaction: discord.Interaction, employee: discord.Member):
-            if not await is_guild(interaction):
-                return
-    
-            try:
-                await interaction.response.defer(ephemeral=True)
-            except:
-                return
-                
-            if not await check_employee_exists(interaction, employee):
-                await interaction.followup.send("❌ Этот работник не найден в базе данных", ephemeral=True)
-                return
-    
-            warnings = self.database.get_warnings(employee.id)
+            record = interaction.extras["employee"]
     
             embed = discord.Embed(title="📋 Информация о работнике", color=0x00ff00)
             embed.add_field(name="Имя", value=employee.display_name, inline=True)
-            embed.add_field(name="Должность", value=self.database.get_employee(employee.id)["position"], inline=True)
-            embed.add_field(name="Дата приема", value=self.database.get_employee(employee.id)["join_date"], inline=True)
-            embed.add_field(name="Выговоры", value=f"{warnings}/3", inline=True)
+            embed.add_field(name="Должность", value=record.position, inline=True)
+            embed.add_field(name="Дата приема", value=record.join_date, inline=True)
+            embed.add_field(name="Выговоры", value=f"{record.warnings}/3", inline=True)
+            if record.departed:
+                embed.add_field(name="Покинул сервер", value=record.departed, inline=True)
+            vacations = self.scheduler.pending(interaction.guild.id, employee.id, ("vacation_end",))
+            if vacations:
+                embed.add_field(name="В отпуске до", value=datetime.fromtimestamp(vacations[-1]["due"]).strftime("%d.%m.%Y %H:%M"), inline=True)
     
-            await interaction.followup.send(embed=embed, ephemeral=True)
+            await self.followup(interaction, embed=embed, ephemeral=True)
 
         @self.tree.command(name="выговор", description="Выдает выговор работнику")
         @app_commands.describe(employee="Выберите работника", reason="Причина для выговора")
+        @command(cooldown="warn", employee=True)
         async def warn(interaction: discord.Interaction, employee: discord.Member, reason: str):
-            if not await is_guild(interaction):
-                return
-            
-            if not self.check_cooldown(interaction.user.id, "warn", 10):
-                await interaction.response.send_message("❌ Подождите 10 секунд перед следующим выговором", ephemeral=True)
-                return
-            
             if employee.id == interaction.user.id:
-                await interaction.response.send_message("❌ Нельзя выдать выговор самому себе!", ephemeral=True)
+                await self.followup(interaction, "❌ Нельзя выдать выговор самому себе!", ephemeral=True)
                 return
             
             if len(reason) > 500:
-                await interaction.response.send_message("❌ Причина слишком длинная (максимум 500 символов)", ephemeral=True)
-                return
-            
-            if not await check_permissions(interaction):
-                await interaction.response.send_message("❌ Недостаточно прав", ephemeral=True)
-                return
-            
-            try:
-                await interaction.response.defer(ephemeral=True)
-            except:
-                return
-            
-            if not await check_employee_exists(interaction, employee):
-                await interaction.followup.send("❌ Этот работник не найден в базе данных", ephemeral=True)
+                await self.followup(interaction, "❌ Причина слишком длинная (максимум 500 символов)", ephemeral=True)
                 return
+
+            database = interaction.extras["database"]
+            record = interaction.extras["employee"]
             
-            current_warnings = self.database.get_warnings(employee.id) + 1
-            await self.database.set_warnings(employee.id, current_warnings)
-            
-            if current_warnings == 1:
-                role = employee.guild.get_role(1398751720665780324)
-                if role:
-                    try:
-                        await employee.add_roles(role)
-                    except Exception as e:
-                        print(f"❌ Ошибка выдачи роли выговора: {e}")
+            current_warnings = record.warnings + 1
+            await asyncio.gather(
+                database.set_warnings(employee.id, current_warnings),
+                database.ledger.record("warn", employee.id, interaction.user.id, 1, reason)
+            )
             
             MAX_WARNINGS = 3
             
@@ -349,59 +2481,39 @@ class StaffBot(discord.Client):
                 embed.add_field(name="Дата", value=datetime.now().strftime("%d.%m.%Y"), inline=True)
                 embed.add_field(name="Выговоры", value=f"{current_warnings}/{MAX_WARNINGS}", inline=True)
                 
-                await interaction.followup.send(embed=embed)
-                await self.send_to_employee_dm(employee, embed)
+                await self.followup(interaction, embed=embed)
+                self.send_to_employee_dm(employee, embed)
                 
-                await self.database.remove_warnings(employee.id)
-                await self.auto_dismiss_employee(interaction, employee)
+                await self.auto_dismiss_employee(interaction, employee, record)
                 return
             
+            self.schedule_warning_decay(interaction.guild.id, employee.id, interaction.user.id)
+            
             embed = discord.Embed(title="⚠️ Выговор работника", color=0xff0000)
             embed.add_field(name="Работник", value=employee.mention, inline=True)
             embed.add_field(name="Причина", value=reason, inline=False)
             embed.add_field(name="Дата", value=datetime.now().strftime("%d.%m.%Y"), inline=True)
             embed.add_field(name="Выговоры", value=f"{current_warnings}/{MAX_WARNINGS}", inline=True)
             
-            await interaction.followup.send(embed=embed)
+            await self.followup(interaction, embed=embed)
 
         @self.tree.command(name="снять_выговор", description="Снимает выговор у работника")
         @app_commands.describe(employee="Выберите работника", amount="Количество выговоров для снятия", reason="Причина снятия")
-        async def remove_warn(interaction: discord.Interaction, employee: discord.Member, amount: int = 1, reason: str = "Не указана"):
-            if not await is_guild(interaction):
-                return
-            
-            if not self.check_cooldown(interaction.user.id, "remove_warn", 5):
-                await interaction.response.send_message("❌ Подождите 5 секунд перед следующей командой", ephemeral=True)
-                return
-            
-            if not await check_permissions(interaction):
-                await interaction.response.send_message("❌ Недостаточно прав", ephemeral=True)
-                return
-            
-            try:
-                await interaction.response.defer(ephemeral=True)
-            except:
-                return
-            
-            if not await check_employee_exists(interaction, employee):
-                await interaction.followup.send("❌ Этот работник не найден в базе данных", ephemeral=True)
-                return
+        @command(cooldown="remove_warn", employee=True)
+        async def remove_warn(interaction: discord.Interaction, employee: discord.Member, amount: app_commands.Range[int, 1, 3] = 1, reason: str = "Не указана"):
+            database = interaction.extras["database"]
             
-            current_warnings = self.database.get_warnings(employee.id)
+            current_warnings = interaction.extras["employee"].warnings
             if current_warnings <= 0:
-                await interaction.followup.send("❌ У этого работника нет выговоров", ephemeral=True)
+                await self.followup(interaction, "❌ У этого работника нет выговоров", ephemeral=True)
                 return
             
             new_warnings = max(0, current_warnings - amount)
-            await self.database.set_warnings(employee.id, new_warnings)
-            
-            if new_warnings < 1:
-                role = employee.guild.get_role(1398751720665780324)
-                if role and role in employee.roles:
-                    try:
-                        await employee.remove_roles(role)
-                    except Exception as e:
-                        print(f"❌ Ошибка снятия роли выговора: {e}")
+            await asyncio.gather(
+                database.set_warnings(employee.id, new_warnings),
+                database.ledger.record("unwarn", employee.id, interaction.user.id, current_warnings - new_warnings, reason)
+            )
+            self.scheduler.cancel(interaction.guild.id, employee.id, ("warning_decay",), current_warnings - new_warnings)
             
             if new_warnings == 0:
                 warnings_text = "0/3"
@@ -410,73 +2522,56 @@ class StaffBot(discord.Client):
             
             embed = discord.Embed(title="✅ Снятие выговора", color=0x00ff00)
             embed.add_field(name="Работник", value=employee.mention, inline=True)
-            embed.add_field(name="Снято выговоров", value=str(amount), inline=True)
+            embed.add_field(name="Снято выговоров", value=str(current_warnings - new_warnings), inline=True)
             embed.add_field(name="Текущее количество", value=warnings_text, inline=True)
             embed.add_field(name="Причина снятия", value=reason, inline=False)
             embed.add_field(name="Дата", value=datetime.now().strftime("%d.%m.%Y"), inline=True)
             
-            await interaction.followup.send(embed=embed)
+            await self.followup(interaction, embed=embed)
 
         @self.tree.command(name="зарплата", description="Выплата")  
         @app_commands.describe(employee="Выберите работника", amount="Сумма выплаты", date="Дата выдачи")
+        @command(cooldown="salary", employee=True)
         async def salary(interaction: discord.Interaction, employee: discord.Member, amount: str, date: str = None):
-            if not await is_guild(interaction):
-                return
-            
-            if not self.check_cooldown(interaction.user.id, "salary", 5):
-                await interaction.response.send_message("❌ Подождите 5 секунд перед следующей командой", ephemeral=True)
-                return
-            
-            if not await check_permissions(interaction):
-                await interaction.response.send_message("❌ Недостаточно прав", ephemeral=True)
-                return
-            
-            try:
-                await interaction.response.defer(ephemeral=True)
-            except:
-                return
-            
-            if not await check_employee_exists(interaction, employee):
-                await interaction.followup.send("❌ Этот работник не найден в базе данных", ephemeral=True)
+            value = parse_amount(amount)
+            if value is None:
+                await self.followup(interaction, "❌ Некорректная сумма выплаты", ephemeral=True)
                 return
+
+            if date:
+                try:
+                    paid_at = datetime.strptime(date.strip(), "%d.%m.%Y")
+                except ValueError:
+                    await self.followup(interaction, "❌ Дата должна быть в формате ДД.ММ.ГГГГ", ephemeral=True)
+                    return
+            else:
+                paid_at = datetime.now()
+
+            database = interaction.extras["database"]
+            await database.ledger.record("payment", employee.id, interaction.user.id, value, timestamp=paid_at.timestamp())
        
-            payment_date = date or datetime.now().strftime("%d.%m.%Y")
+            payment_date = paid_at.strftime("%d.%m.%Y")
             embed = discord.Embed(title="💰 Выплата", color=0x00ff00)
             embed.add_field(name="Работник", value=employee.mention, inline=True)
             embed.add_field(name="Дата выдачи", value=payment_date, inline=True)
-            embed.add_field(name="Сумма", value=f"{amount} робуксов", inline=True)
+            embed.add_field(name="Сумма", value=f"{value} робуксов", inline=True)
             embed.set_footer(text=f"Выдал: {interaction.user.display_name}")
             
-            await interaction.followup.send(embed=embed)
+            await self.followup(interaction, embed=embed)
 
         @self.tree.command(name="увольнение", description="Увольнение работника")
         @app_commands.describe(employee="Выберите работника", reason="Причина увольнения")
+        @command(cooldown="dismiss", employee=True)
         async def dismiss(interaction: discord.Interaction, employee: discord.Member, reason: str):
-            if not await is_guild(interaction):
-                return
-            
-            if not self.check_cooldown(interaction.user.id, "dismiss", 10):
-                await interaction.response.send_message("❌ Подождите 10 секунд перед следующей командой", ephemeral=True)
-                return
-            
-            if not await check_permissions(interaction):
-                await interaction.response.send_message("❌ Недостаточно прав", ephemeral=True)
-                return
-            
-            try:
-                await interaction.response.defer(ephemeral=True)
-            except:
-                return
-  
-            if not await check_employee_exists(interaction, employee):
-                await interaction.followup.send("❌ Этот работник не найден в базе данных", ephemeral=True)
-                return
-
-            employee_data = self.database.get_employee(employee.id)
-            start_date = employee_data.get("join_date", employee.joined_at.strftime("%d.%m.%Y")) if employee_data else employee.joined_at.strftime("%d.%m.%Y")
+            database = interaction.extras["database"]
+            start_date = interaction.extras["employee"].join_date
             
-            await self.database.remove_employee(employee.id)
-            await self.database.remove_warnings(employee.id)
+            await asyncio.gather(
+                database.remove_employee(employee.id),
+                database.remove_warnings(employee.id),
+                database.ledger.record("dismiss", employee.id, interaction.user.id, text=reason)
+            )
+            self.scheduler.cancel(interaction.guild.id, employee.id, ("warning_decay", "vacation_end"))
             
             embed = discord.Embed(title="🚪 Увольнение работника", color=0xff6b00)
             embed.add_field(name="Работник", value=employee.mention, inline=True)
@@ -484,63 +2579,234 @@ class StaffBot(discord.Client):
             embed.add_field(name="Причина", value=reason, inline=False)
             embed.set_footer(text=f"Уволил: {interaction.user.display_name}")
             
-            await interaction.followup.send(embed=embed)
-            await self.send_to_employee_dm(employee, embed)
-            
-            role_ids = [1200579581111959620]
-            for role_id in role_ids:
-                role = employee.guild.get_role(role_id)
-                if role:
-                    try:
-                        await employee.remove_roles(role)
-                    except Exception as e:
-                        print(f"❌ Ошибка снятия роли при увольнении: {e}")
+            await self.followup(interaction, embed=embed)
+            self.send_to_employee_dm(employee, embed)
 
         @self.tree.command(name="отпуск", description="Отпуск работника")
         @app_commands.describe(employee="Выберите работника", reason="Причина", duration="Срок отпуска")
+        @command(cooldown="vacation", employee=True)
         async def vacation(interaction: discord.Interaction, employee: discord.Member, reason: str, duration: str):
-            if not await is_guild(interaction):
-                return
-            
-            if not self.check_cooldown(interaction.user.id, "vacation", 5):
-                await interaction.response.send_message("❌ Подождите 5 секунд перед следующей командой", ephemeral=True)
-                return
-            
-            if not await check_permissions(interaction):
-                await interaction.response.send_message("❌ Недостаточно прав", ephemeral=True)
-                return
-            
-            try:
-                await interaction.response.defer(ephemeral=True)
-            except:
+            seconds = parse_duration(duration)
+            if seconds is None:
+                await self.followup(interaction, "❌ Не удалось распознать срок (например: 7д, 2 недели, 12ч)", ephemeral=True)
                 return
 
-            if not await check_employee_exists(interaction, employee):
-                await interaction.followup.send("❌ Этот работник не найден в базе данных", ephemeral=True)
-                return
+            database = interaction.extras["database"]
+            await database.ledger.record("vacation", employee.id, interaction.user.id, text=f"{reason} ({duration})")
+            self.scheduler.cancel(interaction.guild.id, employee.id, ("vacation_end",))
+            entry = self.scheduler.schedule("vacation_end", time.time() + seconds, interaction.guild.id, employee.id,
+                                            interaction.user.id, {"reason": reason})
 
             embed = discord.Embed(title="🏖️ Отпуск работника", color=0x00ffff)
             embed.add_field(name="Работник", value=employee.mention, inline=True)
             embed.add_field(name="Причина", value=reason, inline=False)
             embed.add_field(name="Срок", value=duration, inline=True)
             embed.add_field(name="Дата оформления", value=datetime.now().strftime("%d.%m.%Y"), inline=True)
+            embed.add_field(name="Окончание", value=datetime.fromtimestamp(entry["due"]).strftime("%d.%m.%Y %H:%M"), inline=True)
             embed.set_footer(text=f"Оформил: {interaction.user.display_name}")
             
-            await interaction.followup.send(embed=embed)
+            await self.followup(interaction, embed=embed)
 
-        @self.tree.command(name="тест", description="Проверка бота")
-        async def test(interaction: discord.Interaction):
-            if interaction.guild is None:
-                await interaction.response.send_message("❌ Команды можно использовать только на сервере", ephemeral=True)
+        def ledger_since(period: str):
+            today = date.today()
+            if period == "week":
+                return today.toordinal() - 6, "последние 7 дней"
+            if period == "30d":
+                return today.toordinal() - 29, "последние 30 дней"
+            if period == "month":
+                return today.replace(day=1).toordinal(), "текущий месяц"
+            return None, "всё время"
+
+        def add_ledger_totals(embed: discord.Embed, totals: dict):
+            count = lambda kind: totals.get(kind, [0, 0])[0]
+            amount = lambda kind: totals.get(kind, [0, 0])[1]
+            embed.add_field(name="Выговоров выдано", value=str(count("warn")), inline=True)
+            embed.add_field(name="Выговоров снято", value=str(amount("unwarn")), inline=True)
+            embed.add_field(name="Выплачено", value=f"{amount('payment')} робуксов ({count('payment')} выплат)", inline=True)
+            embed.add_field(name="Отпусков", value=str(count("vacation")), inline=True)
+            embed.add_field(name="Увольнений", value=str(count("dismiss")), inline=True)
+
+        @self.tree.command(name="история", description="История выговоров, выплат и отпусков работника")
+        @app_commands.describe(employee="Выберите работника", limit="Количество последних событий")
+        @command()
+        async def history(interaction: discord.Interaction, employee: discord.Member, limit: app_commands.Range[int, 1, 20] = 10):
+            ledger = interaction.extras["database"].ledger
+            events = await ledger.history(employee.id, limit)
+            if not events:
+                await self.followup(interaction, "📜 У этого работника нет записей в журнале", ephemeral=True)
+                return
+
+            lines = []
+            for event in events:
+                amount_text = ""
+                if event.kind == "payment":
+                    amount_text = f" {event.amount} робуксов"
+                elif event.kind == "unwarn":
+                    amount_text = f" ×{event.amount}"
+                reason_text = f" — {event.text[:100]}" if event.text else ""
+                lines.append(f"`{datetime.fromtimestamp(event.timestamp).strftime('%d.%m.%Y')}` "
+                             f"{LEDGER_LABELS[event.kind]}{amount_text}{reason_text} (<@{event.actor_id}>)")
+
+            embed = discord.Embed(title="📜 История работника", description="\n".join(lines), color=0x00ff00)
+            embed.add_field(name="Работник", value=employee.mention, inline=False)
+            add_ledger_totals(embed, ledger.aggregate(employee.id))
+            await self.followup(interaction, embed=embed, ephemeral=True)
+
+        @self.tree.command(name="сводка", description="Сводка выговоров и выплат за период")
+        @app_commands.describe(period="Период", employee="Работник (по умолчанию весь сервер)")
+        @app_commands.choices(period=[
+            app_commands.Choice(name="7 дней", value="week"),
+            app_commands.Choice(name="30 дней", value="30d"),
+            app_commands.Choice(name="Текущий месяц", value="month"),
+            app_commands.Choice(name="Всё время", value="all"),
+        ])
+        @command()
+        async def ledger_summary(interaction: discord.Interaction, period: str = "30d", employee: discord.Member = None):
+            ledger = interaction.extras["database"].ledger
+            since, label = ledger_since(period)
+            totals = ledger.aggregate(employee.id if employee else None, since=since)
+
+            embed = discord.Embed(title=f"📊 Сводка: {label}", color=0x00ff00)
+            embed.add_field(name="Работник", value=employee.mention if employee else "Все работники", inline=False)
+            add_ledger_totals(embed, totals)
+            await self.followup(interaction, embed=embed, ephemeral=True)
+
+        async def position_autocomplete(interaction: discord.Interaction, current: str):
+            if interaction.guild is None or not self.permissions.is_allowed(interaction.user):
+                return []
+            index = self.databases.get(interaction.guild.id).index
+            with metrics.timer("autocomplete_seconds", field="position"):
+                positions = index.positions.complete(current.lower(), 25)
+            return [app_commands.Choice(name=position[:100], value=position[:100]) for position in positions]
+
+        async def name_autocomplete(interaction: discord.Interaction, current: str):
+            if interaction.guild is None or not self.permissions.is_allowed(interaction.user):
+                return []
+            index = self.databases.get(interaction.guild.id).index
+            with metrics.timer("autocomplete_seconds", field="name"):
+                user_ids = index.names.complete(current.lower(), 25)
+            names = dict.fromkeys(index.entries[user_id][0] for user_id in user_ids)
+            return [app_commands.Choice(name=name[:100], value=name[:100]) for name in names]
+
+        add_employee.autocomplete("position")(position_autocomplete)
+
+        @self.tree.command(name="поиск", description="Поиск работников по должности, имени, выговорам и дате приема")
+        @app_commands.describe(
+            position="Должность",
+            name="Имя или его начало",
+            warnings="Количество выговоров",
+            joined_after="Принят не раньше (ДД.ММ.ГГГГ)",
+            joined_before="Принят не позже (ДД.ММ.ГГГГ)"
+        )
+        @app_commands.autocomplete(position=position_autocomplete, name=name_autocomplete)
+        @command()
+        async def search(interaction: discord.Interaction, position: str = None, name: str = None,
+                         warnings: app_commands.Range[int, 0, 10] = None, joined_after: str = None, joined_before: str = None):
+            since = date_ordinal(joined_after.strip()) if joined_after else None
+            until = date_ordinal(joined_before.strip()) if joined_before else None
+            if (joined_after and since is None) or (joined_before and until is None):
+                await self.followup(interaction, "❌ Дата должна быть в формате ДД.ММ.ГГГГ", ephemeral=True)
+                return
+
+            database = interaction.extras["database"]
+            with metrics.timer("staff_search_seconds"):
+                user_ids = database.index.search(position, name, warnings, since, until)
+            if not user_ids:
+                await self.followup(interaction, "🔎 Никого не найдено", ephemeral=True)
+                return
+
+            entries = database.index.entries
+            shown = heapq.nsmallest(20, user_ids, key=lambda user_id: (entries[user_id][1], entries[user_id][0].lower()))
+            embed = discord.Embed(title="🔎 Результаты поиска", color=0x00ff00)
+            for user_id in shown:
+                record = database.get_employee(user_id)
+                member = interaction.guild.get_member(user_id)
+                if member is not None:
+                    mention = member.mention
+                elif record.departed:
+                    mention = f"{record.name} (покинул сервер {record.departed})"
+                else:
+                    mention = record.name
+                warn_text = f" ({record.warnings} выговоров)" if record.warnings > 0 else ""
+                embed.add_field(
+                    name=f"{record.position} - {record.name}",
+                    value=f"{mention}{warn_text}\nПринят: {record.join_date}",
+                    inline=False
+                )
+            footer = f"Найдено: {len(user_ids)}"
+            if len(user_ids) > len(shown):
+                footer += f" • показаны первые {len(shown)}"
+            embed.set_footer(text=footer)
+            await self.followup(interaction, embed=embed, ephemeral=True)
+
+        @self.tree.command(name="экспорт", description="Выгружает базу работников в файл")
+        @app_commands.describe(file_format="Формат файла", warnings="Добавить количество выговоров", history="Добавить историю событий")
+        @app_commands.choices(file_format=[
+            app_commands.Choice(name="CSV", value="csv"),
+            app_commands.Choice(name="JSON Lines", value="jsonl"),
+        ])
+        @command(cooldown="export")
+        async def export(interaction: discord.Interaction, file_format: str = "csv", warnings: bool = False, history: bool = False):
+            limit = interaction.guild.filesize_limit
+            roster = RosterExport(interaction.extras["database"], file_format, warnings, history)
+            with tempfile.TemporaryDirectory(prefix="staff-export-") as directory:
+                with metrics.timer("export_seconds", format=file_format):
+                    paths = await roster.run(directory, limit)
+                if any(os.path.getsize(path) > limit for path in paths):
+                    await self.followup(interaction, "❌ Файл выгрузки слишком большой для вложения", ephemeral=True)
+                    return
+                for path in paths:
+                    metrics.observe("export_bytes", os.path.getsize(path), buckets=Metrics.BYTE_BUCKETS, format=file_format)
+
+                await self.followup(
+                    interaction,
+                    f"📤 Выгружено работников: {len(roster.employees)}",
+                    files=[discord.File(path) for path in paths],
+                    ephemeral=True
+                )
+
+        @self.tree.command(name="напоминание", description="Напоминает в личных сообщениях через указанное время")
+        @app_commands.describe(when="Через сколько напомнить (например: 30мин, 2ч, 3д)", text="Текст напоминания", employee="Работник, к которому относится напоминание")
+        @command(cooldown="reminder", defer=False)
+        async def reminder(interaction: discord.Interaction, when: str, text: str, employee: discord.Member = None):
+            seconds = parse_duration(when)
+            if seconds is None:
+                await interaction.response.send_message("❌ Не удалось распознать срок (например: 30мин, 2ч, 3д)", ephemeral=True)
+                return
+
+            if len(text) > 1000:
+                await interaction.response.send_message("❌ Текст слишком длинный (максимум 1000 символов)", ephemeral=True)
                 return
 
+            data = {"text": text}
+            if employee is not None:
+                data["employee_id"] = employee.id
+            entry = self.scheduler.schedule("reminder", time.time() + seconds, interaction.guild.id, interaction.user.id,
+                                            interaction.user.id, data)
+            await interaction.response.send_message(
+                f"⏰ Напоминание установлено на {datetime.fromtimestamp(entry['due']).strftime('%d.%m.%Y %H:%M')}",
+                ephemeral=True
+            )
+
+        @self.tree.command(name="обновить_конфиг", description="Перечитывает настройки ролей из файла конфигурации")
+        @command(admin=True, defer=False)
+        async def reload_config(interaction: discord.Interaction):
+            self.permissions.reload()
+            await interaction.response.send_message("✅ Конфигурация перезагружена", ephemeral=True)
+
+        @self.tree.command(name="тест", description="Проверка бота")
+        @command(permission=False, defer=False)
+        async def test(interaction: discord.Interaction):
             try:
                 await interaction.response.send_message("✅ Бот работает", ephemeral=True)
             except Exception as e:
                 await interaction.response.send_message(f"❌ Ошибка: {str(e)}", ephemeral=True)
+
+        await self.sync_commands()
         
-token = os.getenv('TOKEN')
-if not token:
-    raise RuntimeError("TOKEN env var is not set. Set TOKEN in env before running the bot")
-bot = StaffBot()
-bot.run(token)
+if __name__ == "__main__":
+    token = os.getenv('TOKEN')
+    if not token:
+        raise RuntimeError("TOKEN env var is not set. Set TOKEN in env before running the bot")
+    bot = StaffBot()
+    bot.run(token)
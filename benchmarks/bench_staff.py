@@ -0,0 +1,325 @@
+"""Benchmarks for StaffDatabase and the slash command handlers.
+
+    python benchmarks/bench_staff.py --sizes 100,10000 --output report.json
+    python benchmarks/bench_staff.py --compare report.json
+
+Handlers run in-process against fake Interaction/Member/Guild objects, so no
+Discord connection or token is needed.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MillesBot
+
+GUILD_ID = 100000000000000001
+MODERATOR_BASE = 900000000000000000
+EMPLOYEE_BASE = 500000000000000000
+POSITIONS = ["Стажёр", "Модератор", "Старший модератор", "Администратор", "Куратор"]
+
+
+class FakePermissions:
+    administrator = True
+
+
+class FakeRole:
+    def __init__(self, role_id):
+        self.id = role_id
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.roles = {}
+        self.members = {}
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+
+class FakeMember:
+    def __init__(self, guild, user_id, name):
+        self.guild = guild
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{user_id}>"
+        self.roles = []
+        self.guild_permissions = FakePermissions()
+        self.joined_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    async def edit(self, roles=None, reason=None):
+        self.roles = list(roles or [])
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+
+    async def defer(self, ephemeral=False):
+        self.done = True
+
+    async def send_message(self, *args, **kwargs):
+        self.done = True
+
+    async def edit_message(self, *args, **kwargs):
+        self.done = True
+
+    def is_done(self):
+        return self.done
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+
+
+class FakeCommand:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeInteraction:
+    def __init__(self, guild, user, command):
+        self.guild = guild
+        self.user = user
+        self.command = FakeCommand(command)
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.extras = {}
+
+
+def write_roster(directory, size):
+    employees = {}
+    warnings = {}
+    for index in range(size):
+        user_id = str(EMPLOYEE_BASE + index)
+        employees[user_id] = {
+            "name": f"employee{index}",
+            "position": POSITIONS[index % len(POSITIONS)],
+            "join_date": "01.01.2024",
+            "active": True
+        }
+        if index % 7 == 0:
+            warnings[user_id] = 1
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "staff_data.json"), "w", encoding="utf-8") as f:
+        json.dump({"employees": employees, "warnings": warnings}, f, ensure_ascii=False)
+
+
+def latency_stats(samples):
+    ordered = sorted(samples)
+    return {
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1]
+    }
+
+
+def seed_sqlite(directory):
+    storage = MillesBot.SqliteStorage(os.path.join(directory, "staff_data.sqlite3"),
+                                      migrate_from=os.path.join(directory, "staff_data.json"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.load()
+    storage.close()
+    storage.executor.shutdown()
+
+
+async def bench_database(directory, size, backend):
+    results = {}
+    if backend == "sqlite":
+        seed_sqlite(directory)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        database = MillesBot.StaffDatabase(MillesBot.create_storage(backend, directory))
+        results["load_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    database.get_all_employees()
+    results["scan_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await database.save_data()
+    results["save_seconds"] = time.perf_counter() - started
+
+    tracemalloc.start()
+    await database.save_data()
+    results["save_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    samples = []
+    for index in range(min(size, 200)):
+        started = time.perf_counter()
+        await database.set_warnings(EMPLOYEE_BASE + index, 2)
+        samples.append(time.perf_counter() - started)
+    results["commit"] = latency_stats(samples)
+
+    await database.close()
+    return results
+
+
+async def bench_handlers(size, iterations, backend):
+    bot = MillesBot.StaffBot()
+    bot.databases.backend = backend
+
+    async def skip_sync():
+        pass
+
+    bot.sync_commands = skip_sync
+    with contextlib.redirect_stdout(io.StringIO()):
+        await bot.setup_hook()
+
+    guild = FakeGuild(GUILD_ID)
+    for role_id in (MillesBot.STAFF_ROLE_ID, MillesBot.WARNING_ROLE_ID):
+        guild.roles[role_id] = FakeRole(role_id)
+    for index in range(min(size, iterations * 3)):
+        member = FakeMember(guild, EMPLOYEE_BASE + index, f"employee{index}")
+        guild.members[member.id] = member
+    bot.get_guild = lambda guild_id: guild if guild_id == guild.id else None
+    bot.get_user = guild.get_member
+
+    callbacks = {name: bot.tree.get_command(name).callback for name in ("выговор", "увольнение", "база_работников")}
+    results = {}
+    moderator = iter(range(MODERATOR_BASE, MODERATOR_BASE + iterations * 10))
+
+    async def run(command, make_args):
+        samples = []
+        for index in range(iterations):
+            interaction = FakeInteraction(guild, FakeMember(guild, next(moderator), "moderator"), command)
+            args = make_args(index)
+            started = time.perf_counter()
+            await callbacks[command](interaction, *args)
+            samples.append(time.perf_counter() - started)
+        results[command] = latency_stats(samples)
+
+    members = list(guild.members.values())
+    await run("база_работников", lambda index: ())
+    await run("выговор", lambda index: (members[index % len(members)], "benchmark"))
+    await run("увольнение", lambda index: (members[-1 - index % len(members)], "benchmark"))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await bot.scheduler.stop()
+        await bot.notifications.stop()
+        await bot.roles.stop()
+        await bot.membership.stop()
+        await MillesBot.metrics.stop()
+        await bot.databases.close()
+    return results
+
+
+async def bench_size(size, backend, iterations):
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="staff-bench-") as tmp:
+        os.chdir(tmp)
+        try:
+            directory = os.path.join(tmp, "data", str(GUILD_ID))
+            write_roster(directory, size)
+            results = {"database": await bench_database(directory, size, backend)}
+            if backend == "json":
+                write_roster(directory, size)
+                for name in os.listdir(directory):
+                    if name.endswith(".journal"):
+                        os.remove(os.path.join(directory, name))
+            results["handlers"] = await bench_handlers(size, iterations, backend)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        else:
+            flat[name] = value
+    return flat
+
+
+def compare(report, baseline, threshold):
+    regressions = []
+    current = flatten(report["results"])
+    previous = flatten(baseline["results"])
+    for name, value in sorted(current.items()):
+        old = previous.get(name)
+        if not old:
+            continue
+        ratio = value / old
+        marker = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:70} {old:12.6g} -> {value:12.6g}  x{ratio:5.2f}{marker}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def print_report(report):
+    for name, value in sorted(flatten(report["results"]).items()):
+        print(f"{name:70} {value:12.6g}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="StaffDatabase and command handler benchmarks")
+    parser.add_argument("--sizes", default="100,1000,10000,100000,1000000")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--compare", help="baseline report to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "iterations": args.iterations,
+            "created": datetime.now(timezone.utc).isoformat()
+        },
+        "results": {}
+    }
+    for size in (int(value) for value in args.sizes.split(",")):
+        print(f"⏱️ {size} сотрудников...", file=sys.stderr)
+        report["results"][str(size)] = await bench_size(size, args.backend, args.iterations)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"❌ Регрессий: {len(regressions)}")
+            return 1
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,562 @@
+"""Local stand-in for the Discord gateway and REST API, for offline load replay.
+
+    python benchmarks/fake_discord.py --spawn-bot --rate 20 --duration 30
+    python benchmarks/fake_discord.py --spawn-bot --trace trace.jsonl --latency 0.1 --ratelimit 0.05
+
+The server speaks enough of gateway v10 (HELLO, IDENTIFY, READY, GUILD_CREATE,
+heartbeats, member chunks) and of the REST API (login, command sync,
+interaction callbacks, followups, member edits, DMs) to run the real StaffBot.
+It replays recorded or synthetic INTERACTION_CREATE traces at a target rate and
+reports deferral latency, missed 3-second deadlines, followup latency and
+throughput. --spawn-bot starts benchmarks/local_bot.py pointed at it.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import signal
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from aiohttp import web, WSMsgType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MillesBot
+
+DISCORD_EPOCH = 1420070400000
+INTERACTION_DEADLINE = 3.0
+
+APPLICATION_ID = 700000000000000001
+GUILD_ID = 100000000000000001
+CHANNEL_ID = 100000000000000002
+OWNER_ID = 800000000000000001
+EMPLOYEE_BASE = 500000000000000000
+MODERATOR_BASE = 900000000000000000
+MODERATOR_ROLE_ID = MillesBot.DEFAULT_CONFIG["allowed_roles"][0]
+
+DEFAULT_MIX = {"выговор": 4, "инфо_работник": 3, "база_работников": 2, "снять_выговор": 1, "зарплата": 1, "увольнение": 1,
+               "история": 1, "сводка": 1, "экспорт": 1, "поиск": 1}
+
+_counter = itertools.count()
+
+
+def snowflake():
+    millis = int(time.time() * 1000) - DISCORD_EPOCH
+    return (millis << 22) | (next(_counter) & 0x3FFFFF)
+
+
+def iso_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def user_payload(user_id, name, bot=False):
+    return {"id": str(user_id), "username": name, "global_name": name, "discriminator": "0", "avatar": None, "bot": bot}
+
+
+def member_payload(user_id, name, roles):
+    return {
+        "user": user_payload(user_id, name),
+        "roles": [str(role_id) for role_id in roles],
+        "nick": None,
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "pending": False,
+        "flags": 0
+    }
+
+
+def role_payload(role_id, name, position, permissions="0"):
+    return {
+        "id": str(role_id), "name": name, "color": 0, "hoist": False, "position": position,
+        "permissions": permissions, "managed": False, "mentionable": False, "flags": 0
+    }
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py only decodes bodies whose Content-Type is exactly application/json.
+    return web.Response(body=json.dumps(data, ensure_ascii=False).encode("utf-8"), status=status,
+                        headers={**(headers or {}), "Content-Type": "application/json"})
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class FakeDiscord:
+    def __init__(self, employees=1000, moderators=500, latency=0.0, jitter=0.0, ratelimit=0.0, retry_after=0.5, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.ratelimit = ratelimit
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.bot_user = user_payload(APPLICATION_ID, "StaffBot", bot=True)
+        self.members = {}
+        for index in range(employees):
+            user_id = EMPLOYEE_BASE + index
+            self.members[user_id] = member_payload(user_id, f"employee{index}", [])
+        for index in range(moderators):
+            user_id = MODERATOR_BASE + index
+            self.members[user_id] = member_payload(user_id, f"moderator{index}", [MODERATOR_ROLE_ID])
+        self.employee_ids = [EMPLOYEE_BASE + index for index in range(employees)]
+        self.moderator_ids = [MODERATOR_BASE + index for index in range(moderators)]
+        self.commands = {}
+        self.sockets = set()
+        self.sequence = 0
+        self.identified = asyncio.Event()
+        self.interactions = {}
+        self.stats = Counter()
+        self.api_latency = {}
+        self.base_url = None
+
+    def app(self):
+        app = web.Application(middlewares=[self.rest_middleware])
+        api = "/api/v10"
+        app.router.add_get("/gateway", self.gateway)
+        app.router.add_get(f"{api}/gateway/bot", self.gateway_bot)
+        app.router.add_get(f"{api}/users/@me", self.current_user)
+        app.router.add_get(f"{api}/oauth2/applications/@me", self.application_info)
+        app.router.add_get(f"{api}/applications/{{app}}/commands", self.list_commands)
+        app.router.add_put(f"{api}/applications/{{app}}/commands", self.sync_commands)
+        app.router.add_put(f"{api}/applications/{{app}}/guilds/{{guild}}/commands", self.sync_commands)
+        app.router.add_post(f"{api}/interactions/{{interaction}}/{{token}}/callback", self.interaction_callback)
+        app.router.add_post(f"{api}/webhooks/{{app}}/{{token}}", self.followup)
+        app.router.add_patch(f"{api}/webhooks/{{app}}/{{token}}/messages/{{message}}", self.edit_followup)
+        app.router.add_patch(f"{api}/guilds/{{guild}}/members/{{user}}", self.edit_member)
+        app.router.add_put(f"{api}/guilds/{{guild}}/members/{{user}}/roles/{{role}}", self.add_member_role)
+        app.router.add_delete(f"{api}/guilds/{{guild}}/members/{{user}}/roles/{{role}}", self.remove_member_role)
+        app.router.add_get(f"{api}/guilds/{{guild}}/members/{{user}}", self.get_member)
+        app.router.add_get(f"{api}/users/{{user}}", self.get_user)
+        app.router.add_post(f"{api}/users/@me/channels", self.create_dm)
+        app.router.add_post(f"{api}/channels/{{channel}}/messages", self.send_message)
+        return app
+
+    @web.middleware
+    async def rest_middleware(self, request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        bootstrap = route in ("/gateway", "/api/v10/gateway/bot", "/api/v10/users/@me", "/api/v10/oauth2/applications/@me")
+        if not bootstrap:
+            delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.ratelimit and self.random.random() < self.ratelimit and "/callback" not in route:
+                self.stats["ratelimited"] += 1
+                return json_response(
+                    {"message": "You are being rate limited.", "retry_after": self.retry_after, "global": False},
+                    status=429,
+                    headers={"Via": "1.1 google", "Retry-After": str(self.retry_after),
+                             "X-RateLimit-Limit": "5", "X-RateLimit-Remaining": "0",
+                             "X-RateLimit-Reset-After": str(self.retry_after), "X-RateLimit-Bucket": route}
+                )
+        started = time.perf_counter()
+        try:
+            return await handler(request)
+        finally:
+            self.api_latency.setdefault(f"{request.method} {route}", []).append(time.perf_counter() - started)
+
+    def message_payload(self, content=None, embeds=None, author=None, channel_id=CHANNEL_ID):
+        return {
+            "id": str(snowflake()), "channel_id": str(channel_id), "type": 0, "content": content or "",
+            "author": author or self.bot_user, "attachments": [], "embeds": embeds or [], "mentions": [],
+            "mention_roles": [], "mention_everyone": False, "pinned": False, "tts": False, "flags": 0,
+            "components": [], "timestamp": iso_now(), "edited_timestamp": None
+        }
+
+    async def read_payload(self, request):
+        if request.content_type.startswith("multipart/"):
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name == "payload_json":
+                    return json.loads(await part.text())
+            return {}
+        if request.can_read_body:
+            return await request.json()
+        return {}
+
+    # Gateway
+
+    async def send(self, ws, op, data=None, event=None):
+        payload = {"op": op, "d": data, "s": None, "t": event}
+        if op == 0:
+            self.sequence += 1
+            payload["s"] = self.sequence
+        await ws.send_str(json.dumps(payload, ensure_ascii=False))
+
+    async def dispatch(self, event, data):
+        for ws in list(self.sockets):
+            await self.send(ws, 0, data, event)
+
+    def guild_payload(self):
+        return {
+            "id": str(GUILD_ID), "name": "Load test", "icon": None, "owner_id": str(OWNER_ID),
+            "roles": [
+                role_payload(GUILD_ID, "@everyone", 0),
+                role_payload(MillesBot.STAFF_ROLE_ID, "Сотрудник", 1),
+                role_payload(MillesBot.WARNING_ROLE_ID, "Выговор", 2),
+                role_payload(MODERATOR_ROLE_ID, "Модератор", 3),
+                role_payload(APPLICATION_ID + 1, "StaffBot", 10, permissions="8")
+            ],
+            "members": list(self.members.values()) + [member_payload(APPLICATION_ID, "StaffBot", [APPLICATION_ID + 1])],
+            "member_count": len(self.members) + 1,
+            "channels": [{"id": str(CHANNEL_ID), "type": 0, "name": "general", "position": 0, "permission_overwrites": []}],
+            "threads": [], "presences": [], "voice_states": [], "emojis": [], "stickers": [], "features": [],
+            "stage_instances": [], "guild_scheduled_events": [], "soundboard_sounds": [],
+            "unavailable": False, "large": len(self.members) > 250, "joined_at": "2024-01-01T00:00:00+00:00",
+            "verification_level": 0, "default_message_notifications": 0, "explicit_content_filter": 0,
+            "mfa_level": 0, "afk_timeout": 300, "system_channel_flags": 0, "premium_tier": 0,
+            "preferred_locale": "ru", "nsfw_level": 0, "premium_progress_bar_enabled": False
+        }
+
+    async def gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        await self.send(ws, 10, {"heartbeat_interval": 41250})
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(message.data)
+                op = payload.get("op")
+                if op == 1:
+                    await self.send(ws, 11)
+                elif op == 2:
+                    self.sockets.add(ws)
+                    await self.send(ws, 0, {
+                        "v": 10, "user": self.bot_user, "guilds": [{"id": str(GUILD_ID), "unavailable": True}],
+                        "session_id": "local-session", "resume_gateway_url": self.base_url.replace("http", "ws", 1) + "/gateway",
+                        "shard": payload["d"].get("shard", [0, 1]), "application": {"id": str(APPLICATION_ID), "flags": 0}
+                    }, "READY")
+                    await self.send(ws, 0, self.guild_payload(), "GUILD_CREATE")
+                    self.identified.set()
+                elif op == 6:
+                    await self.send(ws, 9, False)
+                elif op == 8:
+                    data = payload["d"]
+                    await self.send(ws, 0, {
+                        "guild_id": str(GUILD_ID), "members": list(self.members.values()),
+                        "chunk_index": 0, "chunk_count": 1, "nonce": data.get("nonce")
+                    }, "GUILD_MEMBERS_CHUNK")
+        finally:
+            self.sockets.discard(ws)
+        return ws
+
+    # REST
+
+    async def gateway_bot(self, request):
+        return json_response({
+            "url": self.base_url.replace("http", "ws", 1) + "/gateway", "shards": 1,
+            "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1}
+        })
+
+    async def current_user(self, request):
+        return json_response(self.bot_user)
+
+    async def application_info(self, request):
+        return json_response({
+            "id": str(APPLICATION_ID), "name": "StaffBot", "icon": None, "description": "", "bot_public": False,
+            "bot_require_code_grant": False, "verify_key": "0" * 64, "flags": 0,
+            "owner": user_payload(OWNER_ID, "owner"), "team": None, "rpc_origins": []
+        })
+
+    async def list_commands(self, request):
+        return json_response(list(self.commands.values()))
+
+    async def sync_commands(self, request):
+        self.commands = {}
+        for command in await request.json():
+            command = dict(command, id=str(snowflake()), application_id=str(APPLICATION_ID), version=str(snowflake()))
+            self.commands[command["name"]] = command
+        self.stats["command_syncs"] += 1
+        return json_response(list(self.commands.values()))
+
+    async def interaction_callback(self, request):
+        record = self.interactions.get(int(request.match_info["interaction"]))
+        now = time.perf_counter()
+        payload = await self.read_payload(request)
+        if record is None or record.get("callback_at") is not None or now - record["sent_at"] > INTERACTION_DEADLINE:
+            if record is not None and record.get("callback_at") is None:
+                record["expired"] = True
+            self.stats["unknown_interaction"] += 1
+            return json_response({"message": "Unknown interaction", "code": 10062}, status=404)
+
+        record["callback_at"] = now
+        record["callback_type"] = payload.get("type")
+        data = payload.get("data") or {}
+        ephemeral = bool((data.get("flags") or 0) & 64)
+        response = {
+            "interaction": {
+                "id": str(record["id"]), "type": 2, "response_message_loading": payload.get("type") == 5,
+                "response_message_ephemeral": ephemeral
+            },
+            "resource": {"type": payload.get("type")}
+        }
+        if payload.get("type") in (4, 7):
+            response["resource"]["message"] = self.message_payload(data.get("content"), data.get("embeds"))
+            record["completed_at"] = now
+        return json_response(response)
+
+    async def followup(self, request):
+        payload = await self.read_payload(request)
+        record = self.interactions.get(request.match_info["token"])
+        if record is not None:
+            now = time.perf_counter()
+            record.setdefault("first_followup_at", now)
+            record["completed_at"] = now
+            record["followups"] = record.get("followups", 0) + 1
+        self.stats["followups"] += 1
+        return json_response(self.message_payload(payload.get("content"), payload.get("embeds")))
+
+    async def edit_followup(self, request):
+        payload = await self.read_payload(request)
+        self.stats["followup_edits"] += 1
+        return json_response(self.message_payload(payload.get("content"), payload.get("embeds")))
+
+    def member_or_404(self, request):
+        return self.members.get(int(request.match_info["user"]))
+
+    async def edit_member(self, request):
+        member = self.member_or_404(request)
+        if member is None:
+            return json_response({"message": "Unknown Member", "code": 10007}, status=404)
+        payload = await request.json()
+        if "roles" in payload:
+            member["roles"] = [str(role_id) for role_id in payload["roles"]]
+        self.stats["role_edits"] += 1
+        await self.dispatch("GUILD_MEMBER_UPDATE", dict(member, guild_id=str(GUILD_ID)))
+        return json_response(member)
+
+    async def add_member_role(self, request):
+        member = self.member_or_404(request)
+        if member is None:
+            return json_response({"message": "Unknown Member", "code": 10007}, status=404)
+        if request.match_info["role"] not in member["roles"]:
+            member["roles"].append(request.match_info["role"])
+        self.stats["role_edits"] += 1
+        await self.dispatch("GUILD_MEMBER_UPDATE", dict(member, guild_id=str(GUILD_ID)))
+        return web.Response(status=204)
+
+    async def remove_member_role(self, request):
+        member = self.member_or_404(request)
+        if member is None:
+            return json_response({"message": "Unknown Member", "code": 10007}, status=404)
+        member["roles"] = [role_id for role_id in member["roles"] if role_id != request.match_info["role"]]
+        self.stats["role_edits"] += 1
+        await self.dispatch("GUILD_MEMBER_UPDATE", dict(member, guild_id=str(GUILD_ID)))
+        return web.Response(status=204)
+
+    async def get_member(self, request):
+        member = self.member_or_404(request)
+        if member is None:
+            return json_response({"message": "Unknown Member", "code": 10007}, status=404)
+        return json_response(member)
+
+    async def get_user(self, request):
+        member = self.member_or_404(request)
+        if member is None:
+            return json_response({"message": "Unknown User", "code": 10013}, status=404)
+        return json_response(member["user"])
+
+    async def create_dm(self, request):
+        payload = await request.json()
+        member = self.members.get(int(payload["recipient_id"]))
+        recipient = member["user"] if member else user_payload(payload["recipient_id"], "unknown")
+        return json_response({"id": str(int(payload["recipient_id"]) + 1), "type": 1, "recipients": [recipient],
+                                  "last_message_id": None})
+
+    async def send_message(self, request):
+        payload = await self.read_payload(request)
+        self.stats["dms"] += 1
+        return json_response(self.message_payload(payload.get("content"), payload.get("embeds"),
+                                                      channel_id=int(request.match_info["channel"])))
+
+    # Replay
+
+    def synthetic_entry(self, index, mix):
+        names = [name for name in mix if name in self.commands]
+        command = self.random.choices(names, weights=[mix[name] for name in names])[0]
+        options = {}
+        for option in self.commands[command].get("options", []):
+            if not option.get("required", False):
+                continue
+            if option["type"] == 6:
+                options[option["name"]] = self.random.choice(self.employee_ids)
+            elif option["type"] == 4:
+                options[option["name"]] = 1
+            elif option["name"] == "amount":
+                options[option["name"]] = str(100 + index)
+            else:
+                options[option["name"]] = f"load test {index}"
+        return {"command": command, "user": self.moderator_ids[index % len(self.moderator_ids)], "options": options}
+
+    def interaction_payload(self, entry):
+        command = self.commands[entry["command"]]
+        interaction_id = snowflake()
+        token = f"token-{interaction_id}"
+        moderator = self.members[entry["user"]]
+        options = []
+        resolved = {"users": {}, "members": {}}
+        types = {option["name"]: option["type"] for option in command.get("options", [])}
+        for name, value in entry["options"].items():
+            option_type = types.get(name, 3)
+            options.append({"name": name, "type": option_type, "value": str(value) if option_type == 6 else value})
+            if option_type == 6:
+                member = self.members[int(value)]
+                resolved["users"][str(value)] = member["user"]
+                resolved["members"][str(value)] = {key: item for key, item in member.items() if key != "user"}
+        data = {"id": command["id"], "name": command["name"], "type": 1, "options": options}
+        if options:
+            data["resolved"] = resolved
+        return interaction_id, token, {
+            "id": str(interaction_id), "application_id": str(APPLICATION_ID), "type": 2, "token": token,
+            "version": 1, "guild_id": str(GUILD_ID), "channel_id": str(CHANNEL_ID),
+            "channel": {"id": str(CHANNEL_ID), "type": 0, "guild_id": str(GUILD_ID), "name": "general",
+                        "position": 0, "permission_overwrites": []},
+            "member": dict(moderator, permissions="0"), "app_permissions": "8", "locale": "ru",
+            "guild_locale": "ru", "entitlements": [], "authorizing_integration_owners": {"0": str(GUILD_ID)},
+            "context": 0, "attachment_size_limit": 26214400, "data": data
+        }
+
+    async def replay(self, entries, rate, record_to=None):
+        interval = 1.0 / rate if rate else 0.0
+        started = time.perf_counter()
+        recorded = []
+        for index, entry in enumerate(entries):
+            target = started + (entry["at"] if "at" in entry else index * interval)
+            delay = target - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            interaction_id, token, payload = self.interaction_payload(entry)
+            record = {"id": interaction_id, "command": entry["command"], "sent_at": time.perf_counter()}
+            self.interactions[interaction_id] = record
+            self.interactions[token] = record
+            await self.dispatch("INTERACTION_CREATE", payload)
+            recorded.append(dict(entry, at=round(record["sent_at"] - started, 6)))
+        if record_to:
+            with open(record_to, "w", encoding="utf-8") as f:
+                for entry in recorded:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return time.perf_counter() - started
+
+    def report(self, elapsed):
+        records = {record["id"]: record for record in self.interactions.values()}.values()
+        by_command = {}
+        for record in records:
+            by_command.setdefault(record["command"], []).append(record)
+
+        def summarize(items):
+            defer = [item["callback_at"] - item["sent_at"] for item in items if item.get("callback_at")]
+            followup = [item["first_followup_at"] - item["sent_at"] for item in items if item.get("first_followup_at")]
+            complete = [item["completed_at"] - item["sent_at"] for item in items if item.get("completed_at")]
+            return {
+                "sent": len(items),
+                "acknowledged": len(defer),
+                "missed_deadline": sum(1 for item in items if not item.get("callback_at")),
+                "defer_p50": percentile(defer, 0.5), "defer_p95": percentile(defer, 0.95), "defer_max": max(defer, default=0.0),
+                "followup_p50": percentile(followup, 0.5), "followup_p95": percentile(followup, 0.95),
+                "complete_p95": percentile(complete, 0.95),
+                "complete_mean": statistics.fmean(complete) if complete else 0.0
+            }
+
+        completed = sum(1 for record in records if record.get("completed_at"))
+        return {
+            "elapsed": elapsed,
+            "throughput": completed / elapsed if elapsed else 0.0,
+            "overall": summarize(list(records)),
+            "commands": {name: summarize(items) for name, items in sorted(by_command.items())},
+            "api": {route: {"count": len(samples), "p95": percentile(samples, 0.95)} for route, samples in sorted(self.api_latency.items())},
+            "counters": dict(self.stats)
+        }
+
+
+def load_trace(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_report(report):
+    overall = report["overall"]
+    print(f"⏱️ {overall['sent']} взаимодействий за {report['elapsed']:.1f}с, пропускная способность {report['throughput']:.1f}/с")
+    print(f"   пропущено окно 3с: {overall['missed_deadline']}, defer p50={overall['defer_p50']:.4f} p95={overall['defer_p95']:.4f} max={overall['defer_max']:.4f}")
+    for name, summary in report["commands"].items():
+        print(f"   {name:18} n={summary['sent']:5} defer p95={summary['defer_p95']:.4f} "
+              f"followup p95={summary['followup_p95']:.4f} complete p95={summary['complete_p95']:.4f} missed={summary['missed_deadline']}")
+    print(f"   счётчики: {report['counters']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local Discord gateway/REST stand-in for StaffBot load replay")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--moderators", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="added REST latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--ratelimit", type=float, default=0.0, help="probability of answering a REST call with 429")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--rate", type=float, default=10.0, help="interactions per second for synthetic traces")
+    parser.add_argument("--duration", type=float, default=30.0, help="length of a synthetic trace in seconds")
+    parser.add_argument("--trace", help="JSON Lines trace to replay instead of a synthetic one")
+    parser.add_argument("--record", help="write the replayed trace to this file")
+    parser.add_argument("--drain", type=float, default=5.0, help="seconds to wait for late followups")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spawn-bot", action="store_true", help="start benchmarks/local_bot.py against this server")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    server = FakeDiscord(args.employees, args.moderators, args.latency, args.jitter,
+                         args.ratelimit, args.retry_after, args.seed)
+    server.base_url = f"http://127.0.0.1:{args.port}"
+    runner = web.AppRunner(server.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    print(f"🛰️ Локальный Discord слушает {server.base_url}", file=sys.stderr)
+
+    bot_process = None
+    data_dir = None
+    if args.spawn_bot:
+        data_dir = tempfile.TemporaryDirectory(prefix="staff-loadtest-")
+        bot_process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_bot.py"),
+            "--api", server.base_url, "--data-dir", data_dir.name, "--roster", str(args.employees),
+            "--guild-id", str(GUILD_ID)
+        )
+
+    try:
+        await server.identified.wait()
+        await asyncio.sleep(1.0)
+        if args.trace:
+            entries = load_trace(args.trace)
+        else:
+            count = int(args.rate * args.duration)
+            entries = [server.synthetic_entry(index, DEFAULT_MIX) for index in range(count)]
+        elapsed = await server.replay(entries, args.rate, args.record)
+        await asyncio.sleep(args.drain)
+        report = server.report(elapsed)
+    finally:
+        if bot_process is not None:
+            if bot_process.returncode is None:
+                bot_process.send_signal(signal.SIGINT)
+                try:
+                    await asyncio.wait_for(bot_process.wait(), 10)
+                except asyncio.TimeoutError:
+                    bot_process.kill()
+            data_dir.cleanup()
+        await runner.cleanup()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""Run the real StaffBot against benchmarks/fake_discord.py instead of Discord."""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+
+def write_roster(directory, size, employee_base):
+    employees = {
+        str(employee_base + index): {
+            "name": f"employee{index}",
+            "position": "Модератор",
+            "join_date": "01.01.2024",
+            "active": True
+        }
+        for index in range(size)
+    }
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "staff_data.json"), "w", encoding="utf-8") as f:
+        json.dump({"employees": employees, "warnings": {}}, f, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run StaffBot against a local Discord stand-in")
+    parser.add_argument("--api", default="http://127.0.0.1:8765")
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--roster", type=int, default=0, help="seed this many synthetic employees")
+    parser.add_argument("--guild-id", type=int, default=100000000000000001)
+    parser.add_argument("--employee-base", type=int, default=500000000000000000)
+    args = parser.parse_args()
+
+    os.chdir(args.data_dir)
+    if args.roster:
+        write_roster(os.path.join("data", str(args.guild_id)), args.roster, args.employee_base)
+
+    discord.http.Route.BASE = f"{args.api}/api/v10"
+
+    import MillesBot
+
+    bot = MillesBot.StaffBot()
+    bot.run("local-load-test-token", log_level=int(os.getenv("LOG_LEVEL", "40")))
+
+
+if __name__ == "__main__":
+    main()
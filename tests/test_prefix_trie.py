@@ -0,0 +1,66 @@
+"""Randomized PrefixTrie checks against brute-force prefix matching."""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MillesBot
+
+
+def random_term(rng):
+    return "".join(rng.choice("abc") for _ in range(rng.randrange(0, 6)))
+
+
+def check(trie, pairs, rng):
+    term_of = dict((value, term) for term, value in pairs)
+    for prefix in {random_term(rng) for _ in range(20)} | {""}:
+        matching = [(term, value) for term, value in pairs if term.startswith(prefix)]
+        assert sorted(trie.values(prefix)) == sorted(value for _, value in matching)
+
+        limit = rng.randrange(1, 8)
+        found = trie.complete(prefix, limit)
+        assert [term_of[value] for value in found] == sorted(term for term, _ in matching)[:limit]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_add_remove_matches_brute_force(seed):
+    rng = random.Random(seed)
+    trie = MillesBot.PrefixTrie()
+    pairs = []
+    next_value = 0
+    for step in range(400):
+        if pairs and rng.random() < 0.45:
+            term, value = pairs.pop(rng.randrange(len(pairs)))
+            trie.remove(term, value)
+        elif rng.random() < 0.05:
+            trie.remove(random_term(rng), -1)
+        else:
+            pairs.append((random_term(rng), next_value))
+            trie.add(*pairs[-1])
+            next_value += 1
+        if step % 10 == 0:
+            check(trie, pairs, rng)
+    check(trie, pairs, rng)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_build_then_mutate_matches_brute_force(seed):
+    rng = random.Random(seed)
+    pairs = [(random_term(rng), value) for value in range(rng.randrange(0, 60))]
+    trie = MillesBot.PrefixTrie()
+    trie.build(pairs)
+    check(trie, pairs, rng)
+
+    next_value = len(pairs)
+    for _ in range(100):
+        if pairs and rng.random() < 0.5:
+            term, value = pairs.pop(rng.randrange(len(pairs)))
+            trie.remove(term, value)
+        else:
+            pairs.append((random_term(rng), next_value))
+            trie.add(*pairs[-1])
+            next_value += 1
+        check(trie, pairs, rng)
@@ -0,0 +1,116 @@
+"""Round-trip checks for StaffDatabase persistence: journal replay, torn tails and compaction."""
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MillesBot
+
+POSITIONS = ["Стажёр", "Модератор", "Администратор"]
+
+
+def open_database(directory, backend):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return MillesBot.StaffDatabase(MillesBot.create_storage(backend, str(directory)),
+                                       MillesBot.EventLedger(os.path.join(str(directory), "staff_ledger.bin")))
+
+
+def random_commit(database, rng):
+    user_id = rng.randrange(1, 40)
+    kind = rng.choice(("add", "update", "remove", "set_warnings", "remove_warnings"))
+    if kind == "add":
+        return database.add_employee(user_id, f"name{rng.randrange(100)}", rng.choice(POSITIONS),
+                                     rng.choice(("01.01.2024", "15.06.2023", "не указана")))
+    if kind == "update":
+        fields = rng.choice(({"name": f"renamed{rng.randrange(100)}"}, {"position": rng.choice(POSITIONS)},
+                             {"departed": "01.02.2025"}, {"departed": None}, {"join_date": "02.03.2022"}))
+        return database.update_employee(user_id, **fields)
+    if kind == "remove":
+        return database.remove_employee(user_id)
+    if kind == "set_warnings":
+        return database.set_warnings(user_id, rng.randrange(0, 4))
+    return database.remove_warnings(user_id)
+
+
+def abandon(database):
+    # Simulates a crash: committed ops are durable, nothing else is flushed or closed.
+    if database.storage.executor is not None:
+        database.storage.executor.shutdown(wait=True)
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+@pytest.mark.parametrize("seed", range(5))
+def test_random_ops_survive_reload_and_crash(tmp_path, monkeypatch, backend, seed):
+    monkeypatch.setattr(MillesBot.JsonStorage, "COMPACT_THRESHOLD", 7)
+    monkeypatch.setattr(MillesBot.StaffDatabase, "COMMIT_WINDOW", 0)
+    rng = random.Random(seed)
+
+    async def scenario():
+        database = open_database(tmp_path, backend)
+        for _ in range(60):
+            await asyncio.gather(*(random_commit(database, rng) for _ in range(rng.randrange(1, 6))))
+            expected = database.snapshot().to_json()
+            action = rng.random()
+            if action < 0.2:
+                await database.close()
+            elif action < 0.4:
+                if database.compaction_task is not None:
+                    await database.compaction_task
+                abandon(database)
+            else:
+                continue
+            database = open_database(tmp_path, backend)
+            assert database.snapshot().to_json() == expected
+        await database.close()
+
+    asyncio.run(scenario())
+
+
+def test_torn_journal_tail_is_truncated(tmp_path):
+    async def scenario():
+        database = open_database(tmp_path, "json")
+        await database.add_employee(1, "first", "Стажёр", "01.01.2024")
+        await database.close()
+        with open(database.storage.journal_filename, "a", encoding="utf-8") as f:
+            f.write('["add","99",{"na')
+
+        database = open_database(tmp_path, "json")
+        await database.add_employee(2, "second", "Стажёр", "01.01.2024")
+        await database.close()
+
+        database = open_database(tmp_path, "json")
+        assert sorted(database.snapshot()) == [1, 2]
+        await database.close()
+
+    asyncio.run(scenario())
+
+
+def test_crash_between_rotate_and_compact(tmp_path):
+    async def scenario():
+        database = open_database(tmp_path, "json")
+        await database.add_employee(1, "first", "Стажёр", "01.01.2024")
+        await database.set_warnings(1, 2)
+        database.storage.rotate()
+        await database.add_employee(2, "second", "Модератор", "01.01.2024")
+        await database.set_warnings(3, 1)
+        expected = database.snapshot().to_json()
+        abandon(database)
+        assert os.path.exists(database.storage.rotated_filename)
+
+        database = open_database(tmp_path, "json")
+        assert database.snapshot().to_json() == expected
+        await database.save_data()
+        assert not os.path.exists(database.storage.rotated_filename)
+        await database.close()
+
+        database = open_database(tmp_path, "json")
+        assert database.snapshot().to_json() == expected
+        await database.close()
+
+    asyncio.run(scenario())